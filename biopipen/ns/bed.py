@@ -14,20 +14,46 @@ class BedLiftOver(Proc):
 
     Envs:
         liftover: The path to liftOver
-        chain: The map chain file for liftover
+        chain: The map chain file for liftover.
+            It can also be a URL, in which case the chain file is downloaded
+            to `envs.local_chain_dir` and reused in later runs. It is
+            downloaded again only when the remote file is newer.
+        local_chain_dir: The directory to store the chain files downloaded
+            from URLs.
+        engine (choice): The engine to do the liftover.
+            - ucsc: Use the UCSC `liftOver` binary (`envs.liftover`).
+            - ncls: Index the blocks of the chain file with
+                [NCLS](https://github.com/pyranges/ncls) and lift the records
+                over in python. A record is lifted over when both its start
+                and end fall in the aligned blocks of the same chain.
+        cache: The directory to cache the parsed chain file for `ncls` engine,
+            so that the chain file is not parsed again in later runs.
+            The cache is invalidated when the chain file is modified.
+            Set to `False` to disable caching.
+        ncores (type=int): Number of cores to use for `ucsc` engine.
+            The BED file is split into `ncores` chunks, which are lifted
+            over by `liftOver` in parallel and concatenated in order.
 
     Requires:
         liftOver:
+            - if: {{proc.envs.engine == "ucsc"}}
             - check: {{proc.envs.liftover}} 2>&1 | grep "usage"
+        ncls:
+            - if: {{proc.envs.engine == "ncls"}}
+            - check: {{proc.lang}} -c "import ncls"
     """
     input = "inbed:file"
     output = "outbed:file:{{in.inbed | basename}}"
     envs = {
         "liftover": config.exe.liftover,
         "chain": config.path.liftover_chain,
+        "local_chain_dir": "~/.cache/biopipen/chains",
+        "engine": "ucsc",
+        "cache": config.path.tmpdir,
+        "ncores": config.misc.ncores,
     }
-    lang = config.lang.bash
-    script = "file://../scripts/bed/BedLiftOver.sh"
+    lang = config.lang.python
+    script = "file://../scripts/bed/BedLiftOver.py"
 
 
 class Bed2Vcf(Proc):
@@ -57,9 +83,23 @@ class Bed2Vcf(Proc):
             Any converts return `None` will skip the record
         nonexisting_contigs: Whether to `keep` or `drop` the non-existing
             contigs in `ref`.
+            When `drop`, only the contigs used by the BED file are written
+            to the header.
         helpers: Raw code to be executed to provide some helper functions
             since only lambda functions are supported in converters
-        index: Sort and index output file
+        index: Sort and index output file.
+            For `parquet` output, the records are sorted only.
+        ncores (type=int): Number of cores to use.
+            The BED file is split into `ncores` chunks, which are converted
+            in parallel and concatenated in the original order.
+        outformat (choice): The format of the output file.
+            - vcf: Write a VCF file.
+            - parquet: Write a parquet file (zstd-compressed) with the columns
+                `CHROM`, `POS`, `ID`, `REF`, `ALT`, `QUAL`, `FILTER`, `END`,
+                the INFOs by their IDs and the FORMATs as `FORMAT_<ID>`,
+                for faster downstream analysis.
+                INFO/FORMAT with `Number` other than `1` are written as
+                strings, with multiple values joined by `,`.
 
     Requires:
         cyvcf2:
@@ -67,12 +107,17 @@ class Bed2Vcf(Proc):
         pysam:
             - check: {{proc.lang}} -c "import pysam"
         bcftools:
-            - if: {{proc.envs.index}}
+            - if: {{proc.envs.index and proc.envs.outformat == "vcf"}}
             - check: {{proc.envs.bcftools}} --version
+        pyarrow:
+            - if: {{proc.envs.outformat == "parquet"}}
+            - check: {{proc.lang}} -c "import pyarrow"
     """
     input = "inbed:file"
     output = (
-        "outvcf:file:{{in.inbed | stem}}.vcf{{'.gz' if envs.index else ''}}"
+        "outvcf:file:{{in.inbed | stem}}"
+        "{{'.parquet' if envs.outformat == 'parquet' "
+        "else '.vcf.gz' if envs.index else '.vcf'}}"
     )
     lang = config.lang.python
     envs = {
@@ -88,6 +133,8 @@ class Bed2Vcf(Proc):
         "formats": [],
         "converters": {},
         "helpers": "",
+        "ncores": config.misc.ncores,
+        "outformat": "vcf",
     }
     script = "file://../scripts/bed/Bed2Vcf.py"
 
@@ -123,6 +170,8 @@ class BedConsensus(Proc):
             is the percentage of the number of files that cover the region.
             If `cutoff` >= 1, it applies to the number of files that cover the
             region directly.
+            The number of files covering each region is counted by
+            `bedtools multiinter`.
         chrsize: The chromosome sizes file
         distance: When the distance between two bins is smaller than this value,
             they are merged into one bin using `bedtools merge -d`. `0` means
@@ -25,6 +25,10 @@ class RowsBinder(Proc):
             argument and should return a string. The string will be added as
             the last column of the output file.
         filenames_col: The column name for the `filenames` columns
+
+    Requires:
+        r-data.table:
+            - check: {{proc.lang}} <(echo "library(data.table)")
     """
     input = "infiles:files"
     output = (
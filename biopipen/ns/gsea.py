@@ -177,6 +177,7 @@ class Enrichr(Proc):
         dbs: The databases to enrich against.
             See https://maayanlab.cloud/Enrichr/#libraries for all available
             databases/libaries
+        ncores (type=int): Number of cores to query the databases in parallel
     """
     input = "infile:file"
     output = "outdir:dir:{{in.infile | stem}}.enrichr"
@@ -186,6 +187,7 @@ class Enrichr(Proc):
         "genecol": 0,
         "genename": "symbol",
         "dbs": ["KEGG_2021_Human"],
+        "ncores": config.misc.ncores,
     }
     script = "file://../scripts/gsea/Enrichr.R"
     plugin_opts = {"report": "file://../reports/gsea/Enrichr.svelte"}
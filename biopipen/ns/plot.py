@@ -86,7 +86,14 @@ class Heatmap(Proc):
 
     Envs:
         inopts: Options for `read.table()` to read `in.infile`
-        anopts: Options for `read.table()` to read `in.annofiles`
+            The file is read by `data.table::fread()`, with the options mapped
+            and the defaults of `read.table()` kept. `read.table()` is used if
+            there are options `fread()` doesn't support, including `quote`
+            with multiple characters (`read.table()`'s default `"'`) and a
+            non-empty `comment.char` (`read.table()`'s default `#`). So
+            `quote` and `comment.char` are set to `'"'` and `""` by default.
+        anopts: Options for `read.table()` to read `in.annofiles`, read the
+            same way as `in.infile`
         draw: Options for `ComplexHeatmap::draw()`
         args: Arguments for `ComplexHeatmap::Heatmap()`
         devpars: The parameters for device.
@@ -96,6 +103,10 @@ class Heatmap(Proc):
     Requires:
         bioconductor-complexheatmap:
             - check: {{proc.lang}} <(echo "library(ComplexHeatmap)")
+        r-data.table:
+            - check: {{proc.lang}} <(echo "library(data.table)")
+        r-r.utils:
+            - check: {{proc.lang}} <(echo "library(R.utils)")
     """
     input = "infile:file, annofiles:files"
     output = [
@@ -105,8 +116,18 @@ class Heatmap(Proc):
     ]
     lang = config.lang.rscript
     envs = {
-        "inopts": {"header": True, "row.names": -1},
-        "anopts": {"header": True, "row.names": -1},
+        "inopts": {
+            "header": True,
+            "row.names": -1,
+            "quote": '"',
+            "comment.char": "",
+        },
+        "anopts": {
+            "header": True,
+            "row.names": -1,
+            "quote": '"',
+            "comment.char": "",
+        },
         "draw": {},
         "devpars": {},
         "args": {"heatmap_legend_param": {}},
@@ -136,6 +157,12 @@ class ROC(Proc):
         devpars: The parameters for `png()`
         args: Additional arguments for `geom_roc()` or `geom_rocci()` if `envs.ci` is True.
         style_roc: Arguments for `style_roc()`
+
+    Requires:
+        r-data.table:
+            - check: {{proc.lang}} <(echo "library(data.table)")
+        r-r.utils:
+            - check: {{proc.lang}} <(echo "library(R.utils)")
     """  # noqa: E501
     input = "infile:file"
     output = "outfile:file:{{in.infile | stem}}.roc.png"
@@ -192,6 +219,8 @@ class Manhattan(Proc):
             Set it to None to disable the highlighting.
         thin_n (type=int): Number of max points per horizontal partitions of the plot.
             `0` or `None` to disable thinning.
+            The data is thinned before passed to `ggmanh`. The significant
+            points (p-value < `min(envs.signif)`) are always kept.
         thin_bins (type=int): Number of bins to partition the data.
         zoom (auto): Chromosomes to zoom in
             Each chromosome should be separated by comma (`,`) or in a list. Single chromosome is also accepted.
@@ -210,6 +239,12 @@ class Manhattan(Proc):
             See <https://rdrr.io/github/leejs-abv/ggmanh/man/manhattan_plot.html>.
             Note that `-` will be replaced by `.` in the argument names.
             - <more>: Additional arguments for `manhattan_plot()`
+
+    Requires:
+        r-data.table:
+            - check: {{proc.lang}} <(echo "library(data.table)")
+        r-r.utils:
+            - check: {{proc.lang}} <(echo "library(R.utils)")
     """  # noqa: E501
     input = "infile:file"
     output = "outfile:file:{{in.infile | stem0}}.manhattan.png"
@@ -324,6 +359,12 @@ class QQPlot(Proc):
             - dparams (type=json): The parameters for the distribution
             - <more>: Additional arguments for `geom_qq_point()` or `geom_pp_point()`
         ggs (list): Additional ggplot expression to adjust the plot.
+
+    Requires:
+        r-data.table:
+            - check: {{proc.lang}} <(echo "library(data.table)")
+        r-r.utils:
+            - check: {{proc.lang}} <(echo "library(R.utils)")
     """
     input = "infile:file, theorfile:file"
     output = "outfile:file:{{in.infile | stem}}.{{envs.kind}}.png"
@@ -67,6 +67,16 @@ class MotifScan(Proc):
             When `False`, `--no-qvalue` is passed to fimo.
             The q-value calculation is that of Benjamini and Hochberg (BH) (1995).
         q_cutoff (flag): Apply `envs.cutoff` to q-value.
+        ncores (type=int): Number of cores to use.
+            When > 1, the sequences are split into `ncores` shards with roughly
+            equal total bases, which are scanned by fimo in parallel. The
+            q-values are then calculated across all shards. Only `fimo.tsv`
+            is produced in this case, without the other outputs of fimo
+            (html, gff, xml and cisml). A single fimo run is used when
+            there are fewer than 2 sequences.
+        cache: The directory to cache the index of the motif database, so that
+            it is not parsed again when scanning with the same database.
+            Set to `False` to disable caching.
         args (ns): Additional arguments to pass to the tool.
             - <more>: Additional arguments for fimo.
                 See: <https://meme-suite.org/meme/doc/fimo.html>
@@ -84,6 +94,8 @@ class MotifScan(Proc):
         "cutoff": 1e-4,
         "q": False,
         "q_cutoff": False,
+        "ncores": config.misc.ncores,
+        "cache": config.path.tmpdir,
         "args": {},
     }
     script = "file://../scripts/regulatory/MotifScan.py"
@@ -121,8 +133,12 @@ class MotifAffinityTest(Proc):
             - motifBreakR: Use motifBreakR.
             - atsnp: Use atSNP.
             - atSNP: Use atSNP.
-        bcftools: The path to bcftools binary.
+        python: The path to python with [cyvcf2](https://github.com/brentp/cyvcf2)
+            installed.
             Used to convert the VCF file to the BED file when the input is a VCF file.
+        bcftools: Deprecated, use `envs.python` instead.
+            The path to bcftools binary. If provided, it is used to convert
+            the VCF file to the BED file instead of `envs.python` with cyvcf2.
         motif_col: The column name in the motif file containing the motif names.
             If this is not provided, `envs.regulator_col` and `envs.regmotifs` are required,
             which are used to infer the motif names from the regulator names.
@@ -190,6 +206,13 @@ class MotifAffinityTest(Proc):
                 - pval_cond_snp: conditional p-values for the affinity scores of the reference and SNP alleles.
                 - pval_diff: p-value for the affinity score change between the two alleles.
                 - pval_rank: p-value for the rank test between the two alleles.
+
+    Requires:
+        r-future:
+            - check: {{proc.lang}} <(echo "library(future)")
+        cyvcf2:
+            - if: {{not proc.envs.bcftools}}
+            - check: {{proc.envs.python}} -c "import cyvcf2"
     """  # noqa: E501
     input = "motiffile:file, varfile:file"
     output = "outdir:dir:{{in.motiffile | stem}}.{{envs.tool | lower}}"
@@ -197,7 +220,8 @@ class MotifAffinityTest(Proc):
     envs = {
         "ncores": config.misc.ncores,
         "tool": "atsnp",
-        "bcftools": config.exe.bcftools,
+        "python": config.lang.python,
+        "bcftools": None,
         "motif_col": None,
         "regulator_col": None,
         "notfound": "error",
@@ -68,6 +68,12 @@ class UnitConversion(Proc):
             When converting `tpm -> cpm`: it should be total reads of that sample.
             When converting `tpm -> fpkm/rpkm`: it should be `sum(fpkm)` of that sample.
             It is not used when converting `count -> cpm, fpkm/rpkm, tpm`.
+
+    Requires:
+        r-data.table:
+            - check: {{proc.lang}} <(echo "library(data.table)")
+        r-r.utils:
+            - check: {{proc.lang}} <(echo "library(R.utils)")
     """  # noqa: E501
     input = "infile:file"
     output = "outfile:file:{{in.infile | basename}}"
@@ -134,6 +140,10 @@ class Simulation(Proc):
         transpose_output (flag): If set, the output will be transposed.
         index_start (type=int): The index to start from when naming the samples.
             Affects the sample names in `out.outfile` only.
+
+    Requires:
+        r-data.table:
+            - check: {{proc.lang}} <(echo "library(data.table)")
     """
     input = "ngenes:var, nsamples:var"
     output = [
@@ -27,18 +27,25 @@ class SeuratLoading(Proc):
               The path will be read by `Read10X()` from `Seurat`
 
     Output:
-        rdsfile: The RDS file with a list of Seurat object
+        outdir: The directory with a RDS file of Seurat object for each sample,
+            and `manifest.tsv` with columns `Sample` and `RDSFile`, the name of
+            the RDS file of the sample (relative to the directory).
+            The samples are loaded and saved one by one, so that only one
+            of them is in memory at a time, and the downstream processes can
+            load only the samples they need.
 
     Envs:
         qc: The QC filter for each sample.
             This will be passed to `subset(obj, subset=<qc>)`.
             For example
             `nFeature_RNA > 200 & nFeature_RNA < 2500 & percent.mt < 5`
+        ncores (type=int): Number of cores to use to load the samples in
+            parallel.
     """
 
     input = "metafile:file"
-    output = "rdsfile:file:{{in.metafile | stem}}.seurat.RDS"
-    envs = {"qc": ""}
+    output = "outdir:dir:{{in.metafile | stem}}.seurat"
+    envs = {"qc": "", "ncores": config.misc.ncores}
     lang = config.lang.rscript
     script = "file://../scripts/scrna/SeuratLoading.R"
 
@@ -108,6 +108,9 @@ class MatrixEQTL(Proc):
             If cis-eQTLs are enabled, this defaults to `None`, which will disable
             trans-eQTL analysis.
         fdr (flag): Do FDR calculation or not (save memory if not).
+            With FDR, all the reported eQTLs are kept in memory. So it is
+            disabled (with a warning) if the expected number of trans-eQTLs
+            (`#SNPs * #genes * transp`) exceeds what R can hold in a vector.
         snppos: The path of the SNP position file.
             It could be a BED, GFF, VCF or a tab-delimited file with
             `snp`, `chr`, `pos` as the first 3 columns.
@@ -120,6 +123,18 @@ class MatrixEQTL(Proc):
             will be transposed.
         transpose_cov (flag): If set, the covariate matrix (`in.cov`)
             will be transposed.
+        slice_size (type=int): The number of rows (SNPs/genes) in each slice
+            of the matrices. Each pair of slices are computed together by a
+            BLAS matrix multiplication, so slices that are too small are
+            slow, and those that are too large use more memory.
+            An optimized BLAS (e.g. OpenBLAS, MKL) linked to R also speeds
+            up the computation a lot.
+        ncores (type=int): Number of threads for the BLAS library.
+            Requires the R package `RhpcBLASctl` to take effect.
+
+    Requires:
+        r-data.table:
+            - check: {{proc.lang}} <(echo "library(data.table)")
     """
     input = "geno:file, expr:file, cov:file"
     output = [
@@ -139,6 +154,8 @@ class MatrixEQTL(Proc):
         "transpose_geno": False,
         "transpose_expr": False,
         "transpose_cov": False,
+        "slice_size": 2000,
+        "ncores": config.misc.ncores,
     }
     script = "file://../scripts/snp/MatrixEQTL.R"
 
@@ -154,7 +171,12 @@ class PlinkFromVcf(Proc):
         Handle sex when sex chromosomes are included.
 
     Input:
-        invcf: VCF file
+        invcf: VCF/BCF file, or a directory of them (`*.vcf`, `*.vcf.gz`
+            or `*.bcf`), for example, one per chromosome.
+            BCF files are read by plink directly (`--bcf`), which saves the
+            parsing of VCF text. The files in the directory are
+            converted in parallel and then merged by `plink --pmerge-list`.
+            They should have the same samples in the same order.
 
     Output:
         outdir: Output directory containing the PLINK files
@@ -163,7 +185,8 @@ class PlinkFromVcf(Proc):
         plink: Path to PLINK v2
         tabix: Path to tabix
         ncores (type=int): Number of cores/threads to use, will pass to plink
-            `--threads` option
+            `--threads` option. When `in.invcf` is a directory, the cores
+            are shared by the files being converted at the same time.
         vcf_half_call (choice): The current VCF standard does not specify
             how '0/.' and similar GT values should be interpreted.
             - error: error out and reports the line number of the anomaly
@@ -343,6 +366,10 @@ class PlinkHWE(Proc):
             - width (type=int): Width of the plot
             - height (type=int): Height of the plot
             - res (type=int): Resolution of the plot
+
+    Requires:
+        r-data.table:
+            - check: {{proc.lang}} <(echo "library(data.table)")
     """
     input = "indir:dir"
     output = "outdir:dir:{{in.indir | stem}}.hwe"
@@ -384,6 +411,10 @@ class PlinkHet(Proc):
             - width (type=int): Width of the plot
             - height (type=int): Height of the plot
             - res (type=int): Resolution of the plot
+
+    Requires:
+        r-data.table:
+            - check: {{proc.lang}} <(echo "library(data.table)")
     """
     input = "indir:dir"
     output = "outdir:dir:{{in.indir | stem}}.het"
@@ -431,6 +462,10 @@ class PlinkCallRate(Proc):
             - width (type=int): Width of the plot
             - height (type=int): Height of the plot
             - res (type=int): Resolution of the plot
+
+    Requires:
+        r-data.table:
+            - check: {{proc.lang}} <(echo "library(data.table)")
     """
     input = "indir:dir"
     output = "outdir:dir:{{in.indir | stem}}.callrate"
@@ -558,6 +593,9 @@ class PlinkFreq(Proc):
                 `ALT1`, `HET_REF_ALT1_CT`, and `HOM_ALT1_CT` are added. Check
                 `.gcountx` for the added columns.
         gz (flag): If set, compress the output files.
+            The frequency reports are compressed after they are processed,
+            with `pigz` (using `ncores` threads) if available, otherwise
+            `gzip`.
         cutoff (auto): Cutoffs to mark or filter the variants.
             If a float is given, default column will be used based on the modifier.
             For `modifier="none"`, it defaults to `MAF`.
@@ -580,6 +618,10 @@ class PlinkFreq(Proc):
             - width (type=int): Width of the plot
             - height (type=int): Height of the plot
             - res (type=int): Resolution of the plot
+
+    Requires:
+        r-data.table:
+            - check: {{proc.lang}} <(echo "library(data.table)")
     """
     input = "indir:dir"
     output = "outdir:dir:{{in.indir | stem}}.freq"
@@ -298,6 +298,9 @@ class DiffCoexpr(Proc):
     Output:
         outfile: The output file. It is a tab-delimited file with the first
             column as the feature pair and the second column as the p-value.
+            The p-values are permutation p-values, `(b + 1) / (m + 1)`, where
+            `b` is the number of permuted scores that are at least as extreme
+            as the observed one, and `m` is the number of permuted scores.
             ```
             Group  Feature1  Feature2  Pval  Padj
             G1     F1        F2        0.123 0.123
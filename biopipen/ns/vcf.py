@@ -55,10 +55,30 @@ class VcfFilter(Proc):
             `SNPONLY`: keeps only SNPs (`{"SNPONLY": False}` to filter SNPs out)
             `QUAL`: keeps variants with QUAL>=param (`{"QUAL": (30, False)}`)
             to keep only variants with QUAL<30
+            `GQ`: keeps variants with GQ>=param in all samples
+            (`{"GQ": 20}`), the GQ values of all samples are compared at once.
+            Samples with missing GQ are ignored, and variants without any GQ
+            values are filtered out, also with `{"GQ": (20, False)}`
         filter_descs: Descriptions for the filters. Will be saved to the header
             of the output vcf file
         helper: Some helper code for the filters
         keep: Keep the variants not passing the filters?
+        ncores (type=int): Number of cores to use.
+            If `in.invcf` is indexed (`.tbi` or `.csi`), the contigs in the
+            index are filtered in parallel and then concatenated by
+            `bcftools concat`.
+        bcftools: Path to bcftools, used to concatenate the results of the
+            contigs when `envs.ncores > 1`
+
+    Requires:
+        cyvcf2:
+            - check: {{proc.lang}} -c "import cyvcf2"
+        pysam:
+            - if: {{proc.envs.ncores > 1}}
+            - check: {{proc.lang}} -c "import pysam"
+        bcftools:
+            - if: {{proc.envs.ncores > 1}}
+            - check: {{proc.envs.bcftools}} --version
     """  # noqa: E501
     input = "invcf:file"
     output = "outfile:file:{{in.invcf | basename}}"
@@ -68,6 +88,8 @@ class VcfFilter(Proc):
         "keep": True,
         "helper": "",
         "filter_descs": {},
+        "ncores": config.misc.ncores,
+        "bcftools": config.exe.bcftools,
     }
     script = "file://../scripts/vcf/VcfFilter.py"
 
@@ -162,9 +184,23 @@ class VcfSplitSamples(Proc):
         bcftools: Path to bcftools
         gz: Gzip the output VCF files? Has to be True if `envs.index` is True
         index: Index the output VCF files?
-        ncores: Number of cores, used to extract samples, but not to index
+        ncores: Number of cores, used to extract (or to index, with
+            `envs.plugin`) samples in parallel. When there are fewer samples
+            than cores, the spare cores are used by `bcftools` (`--threads`)
+            to compress and index the output
         private: Keep sites where only the sample carries an non-ref allele.
             That means, sites with genotypes like `0/0` will be removed.
+        plugin (flag): Use the `bcftools +split` plugin to write all the
+            samples in a single pass over the input file (bcftools 1.11+).
+            Otherwise, the samples are extracted one by one by
+            `bcftools view`
+
+    Requires:
+        bcftools:
+            - check: {{proc.envs.bcftools}} --version
+        bcftools-split:
+            - if: {{proc.envs.plugin}}
+            - check: {{proc.envs.bcftools}} plugin -l | grep -qw split
     """
     input = "infile:file"
     output = "outdir:dir:{{in.infile | stem}}.splitsamples"
@@ -175,6 +211,7 @@ class VcfSplitSamples(Proc):
         "index": True,
         "ncores": config.misc.ncores,
         "private": True,
+        "plugin": True,
     }
     script = "file://../scripts/vcf/VcfSplitSamples.py"
 
@@ -312,11 +349,21 @@ class VcfAnno(Proc):
         conffile: configuration file for vcfanno or configuration dict itself
             This is ignored when `conffile` is given as input
         args: Additional arguments to pass to vcfanno
+        sites_only (flag): Annotate the sites only, without the genotypes.
+            The genotypes are stripped by `bcftools view -G` before
+            annotation, and the INFO fields are transferred back to the
+            input records by `bcftools annotate`. This saves time for VCF
+            files with many samples.
+        bcftools: Path to bcftools, used when `envs.sites_only` is True
 
     Requires:
         - name: vcfanno
           check: |
             {{proc.envs.vcfanno}} --help
+        - name: bcftools
+          if: {{proc.envs.sites_only}}
+          check: |
+            {{proc.envs.bcftools}} --version
     """
 
     input = "infile:file, conffile"
@@ -327,6 +374,8 @@ class VcfAnno(Proc):
         "ncores": config.misc.ncores,
         "conffile": {},
         "args": {"permissive-overlap": True},
+        "sites_only": False,
+        "bcftools": config.exe.bcftools,
     }
     script = "file://../scripts/vcf/VcfAnno.py"
 
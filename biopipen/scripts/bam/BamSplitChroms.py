@@ -1,3 +1,4 @@
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from biopipen.utils.misc import run_command
 from biopipen.utils.reference import bam_index
@@ -68,7 +69,12 @@ def use_samtools():
         print("\nUsing provided chromosomes")
         chroms = chroms_to_keep
 
-    for chrom in chroms:
+    # The chromosomes are independent, split them in parallel, with the
+    # cores shared among the jobs
+    njobs = max(1, min(ncores, len(chroms)))
+    threads = max(1, ncores // njobs)
+
+    def _split_chrom(chrom):
         print(f"Processing chromosome: {chrom}")
         outfile = (
             f"{outdir}/{chrom}.bam"
@@ -79,7 +85,7 @@ def use_samtools():
             samtools,
             "view",
             "-@",
-            ncores,
+            threads,
             "-o",
             outfile,
             "-b",
@@ -98,10 +104,13 @@ def use_samtools():
                 f"{outdir}/{chrom}.bam",
                 tool="samtools",
                 samtools=samtools,
-                ncores=ncores,
+                ncores=threads,
                 force=True,
             )
 
+    with ThreadPoolExecutor(max_workers=njobs) as executor:
+        list(executor.map(_split_chrom, chroms))
+
     print("\nDone")
 
 
@@ -126,7 +135,12 @@ def use_sambamba():
         print("\nUsing provided chromosomes")
         chroms = chroms_to_keep
 
-    for chrom in chroms:
+    # The chromosomes are independent, split them in parallel, with the
+    # cores shared among the jobs
+    njobs = max(1, min(ncores, len(chroms)))
+    threads = max(1, ncores // njobs)
+
+    def _split_chrom(chrom):
         print(f"Processing chromosome: {chrom}")
         outfile = (
             f"{outdir}/{chrom}.bam"
@@ -137,7 +151,7 @@ def use_sambamba():
             sambamba,
             "view",
             "-t",
-            ncores,
+            threads,
             "-f",
             "bam",
             "-o",
@@ -157,10 +171,13 @@ def use_sambamba():
                 f"{outdir}/{chrom}.bam",
                 tool="sambamba",
                 sambamba=sambamba,
-                ncores=ncores,
+                ncores=threads,
                 force=True,
             )
 
+    with ThreadPoolExecutor(max_workers=njobs) as executor:
+        list(executor.map(_split_chrom, chroms))
+
     print("\nDone")
 
 
@@ -1,12 +1,15 @@
+import errno
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
 from datetime import date
 from pathlib import Path
 
-from diot import Diot, OrderedDiot
-import numpy as np
-from cyvcf2 import VCF, Writer
+from cyvcf2 import Writer
 from pysam import FastaFile
 
 from biopipen.utils.misc import run_command
+from biopipen.utils.vcf import HeaderContig, HeaderFormat, HeaderInfo
 
 inbed = {{in.inbed | quote}}  # pyright: ignore
 outvcf = {{out.outvcf | quote}}  # pyright: ignore
@@ -21,6 +24,8 @@ index = {{envs.index | repr}}  # pyright: ignore
 bcftools = {{envs.bcftools | quote}}  # pyright: ignore
 nonexisting_contigs = {{envs.nonexisting_contigs | quote}}  # pyright: ignore
 genome = {{envs.genome | quote}}  # pyright: ignore
+ncores = {{envs.ncores | int}}  # pyright: ignore
+outformat = {{envs.outformat | quote}}  # pyright: ignore
 {{envs.helpers}}  # pyright: ignore
 {% if envs.sample.startswith("lambda") %}  # pyright: ignore
 instem = {{in.inbed | stem | quote}}  # pyright: ignore
@@ -35,139 +40,468 @@ converters[{{key | quote}}] = {{val}}  # pyright: ignore
 
 if ref == "":
     raise ValueError("Please specify the reference fasta file.")
-fai = f"{ref}.fai"
-if not Path(fai).exists():
-    raise ValueError(f"{fai} does not exist.")
-
-TEMPLATE_VCF = f"""##fileformat=VCFv4.2
-##FILTER=<ID=PASS,Description="All filters passed">
-##fileDate={date.today().strftime("%Y%m%d")}
-#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\t{sample}
-chr1\t1\t.\tA\tT\t.\tPASS\t.\tGT\t0|0
-"""
-
-TEMPLATE_VCF_FILE = joboutdir / "template.vcf"
-TEMPLATE_VCF_FILE.write_text(TEMPLATE_VCF)
-
-vcf = VCF(TEMPLATE_VCF_FILE)
-
-# Add source
-vcf.add_to_header(f"##source=biopipen.ns.bed.Bed2Vcf")
+if not Path(f"{ref}.fai").exists():
+    raise ValueError(
+        f"{ref}.fai does not exist, please index the reference fasta file "
+        "with `samtools faidx`."
+    )
 
+# Build the header as a string, so that cyvcf2 can create the writer
+# without a template VCF file
+header_lines = [
+    "##fileformat=VCFv4.2",
+    '##FILTER=<ID=PASS,Description="All filters passed">',
+    f"##fileDate={date.today().strftime('%Y%m%d')}",
+    "##source=biopipen.ns.bed.Bed2Vcf",
+]
 # Add genome assembly
 if genome:
-    vcf.add_to_header(f"##reference={genome}")
-
-vcf.add_info_to_header(
-    {
-        "ID": "END",
-        "Number": "1",
-        "Type": "Integer",
-        "Description": "End position of the variant described in this record"
-    }
-)
+    header_lines.append(f"##reference={genome}")
 
-vcf.add_format_to_header(
-    {
-        "ID": "GT",
-        "Number": "1",
-        "Type": "String",
-        "Description": "Genotype",
-    }
+header_lines.append(
+    str(
+        HeaderInfo(
+            ID="END",
+            Number="1",
+            Type="Integer",
+            Description="End position of the variant described in this record",
+        )
+    )
+)
+header_lines.append(
+    str(HeaderFormat(ID="GT", Number="1", Type="String", Description="Genotype"))
 )
 
 # Add contigs
-contigs = set()
-with open(fai) as f:
-    for line in f:
-        contig, length, *_ = line.strip().split("\t")
-        contigs.add(contig)
-        vcf.add_to_header(f"##contig=<ID={contig},length={length}>")
+drop_contigs = nonexisting_contigs == "drop"
+with FastaFile(ref) as refseq:
+    contig_names = list(refseq.references)
+    contigs = set(contig_names)
+    if drop_contigs:
+        # Only the contigs used by the BED file are kept in the output
+        with open(inbed, "rb") as f:
+            used_contigs = {line.split(b"\t", 1)[0].decode() for line in f}
+    else:
+        used_contigs = contigs
+
+    for contig, length in zip(refseq.references, refseq.lengths):
+        if contig in used_contigs:
+            header_lines.append(str(HeaderContig(ID=contig, length=length)))
 
-for header in headers:
-    vcf.add_to_header(header)
+header_lines.extend(headers)
 
+header_types = {}
 for info in infos:
-    vcf.add_info_to_header(info)
+    header_types[info["ID"]] = "INFO"
+    header_lines.append(str(HeaderInfo(info)))
 
 for fmt in formats:
-    vcf.add_format_to_header(fmt)
+    header_types[fmt["ID"]] = "FORMAT"
+    header_lines.append(str(HeaderFormat(fmt)))
 
-header_types = {}
-for header in vcf.header_iter():
-    try:
-        header_types[header["ID"]] = header["HeaderType"]
-    except KeyError:
-        pass
-
-refseq = FastaFile(ref)
-variant = next(vcf)
-writer = Writer(tmpoutvcf, vcf)
-try:
-    with open(inbed) as f:
+header_lines.append(
+    "\t".join(
+        ["#CHROM", "POS", "ID", "REF", "ALT", "QUAL", "FILTER", "INFO", "FORMAT"]
+        + [sample]
+    )
+)
+header = "\n".join(header_lines) + "\n"
+
+# Resolve where the value of each converter goes, so that the loop over the
+# records doesn't need to look it up for every record.
+# The converters are compiled once as they are inlined in this script.
+# The FORMAT keys are the same for all records, so the FORMAT converters are
+# resolved to the indexes of their values in the sample column.
+FIELD, INFO, FORMAT = 0, 1, 2
+format_keys = ["GT"]
+resolved_converters = []
+for key, converter in converters.items():
+    if key in ("ID", "REF", "ALT", "QUAL", "FILTER"):
+        resolved_converters.append((FIELD, key, converter))
+    elif header_types.get(key) == "INFO":
+        resolved_converters.append((INFO, key, converter))
+    elif header_types.get(key) == "FORMAT":
+        if key not in format_keys:
+            format_keys.append(key)
+        resolved_converters.append((FORMAT, format_keys.index(key), converter))
+    else:
+        raise ValueError(
+            f"Converter '{key}' is not a VCF field nor an INFO/FORMAT "
+            "defined in envs.infos/envs.formats."
+        )
+
+format_str = ":".join(format_keys)
+# The default GT and placeholders for other FORMAT values
+format_values = ["0|0"] + ["."] * (len(format_keys) - 1)
+# Max number of distinct FORMAT values to cache the sample column strings for
+FORMAT_CACHE_SIZE = 100_000
+# Number of records in each row group of the parquet output
+ROW_GROUP_SIZE = 100_000
+
+fetch_ref = "REF" not in converters
+
+
+def _to_str(val):
+    """Convert a value from the converters to string, with multiple values
+    (list or tuple) joined by `,`"""
+    if isinstance(val, (list, tuple)):
+        return ",".join(str(v) for v in val)
+    return str(val)
+
+
+def _chunks(n):
+    """Split the BED file into (at most) n chunks of byte ranges at line
+    boundaries, so that each chunk can be converted independently"""
+    size = Path(inbed).stat().st_size
+    offsets = [0]
+    with open(inbed, "rb") as f:
+        for i in range(1, n):
+            f.seek(max(size * i // n, offsets[-1]))
+            # move to the start of the next line
+            f.readline()
+            offsets.append(f.tell())
+    offsets.append(size)
+    return [(s, e) for s, e in zip(offsets[:-1], offsets[1:]) if e > s]
+
+
+def _bed_lines(chunk):
+    """Iterate over the lines of the BED file within the byte range"""
+    offset, offset_end = chunk
+    with open(inbed, "rb") as f:
+        f.seek(offset)
         for line in f:
-            # chr,start,end,name,...
-            items = line.rstrip("\n\r").split("\t")
-            if nonexisting_contigs == "drop" and items[0] not in contigs:
-                continue
-            variant.CHROM = items[0]
-            start = int(items[1])
-            end = int(items[2])
-            # The pos will be incremented by 1 with .set_pos()
-            variant.set_pos(start - base)
-            # If it is not a SNP
-            if end - start > base:
-                variant.INFO["END"] = end + 1 - base
-
-            skip = False
-            for key, converter in converters.items():
-                val = converter(items)
-                if val is None:
-                    skip = True
-                    continue
-                if key == "ID":
-                    variant.ID = val
-                elif key == "REF":
-                    variant.REF = val
-                elif key == "ALT":
-                    if isinstance(val, str):
-                        variant.ALT = [val]
-                    else:
-                        variant.ALT = val
-                elif key == "QUAL":
-                    variant.QUAL = val
-                elif key == "FILTER":
-                    variant.FILTER = val
-
-                elif header_types[key] == "FORMAT":
-                    variant.set_format(key, np.array([val]))
-
-                elif header_types[key] == "INFO":
-                    variant.INFO[key] = val
-
-            if skip:
-                continue
-
-            if "REF" not in converters:
-                variant.REF = refseq.fetch(
-                    variant.CHROM,
-                    variant.POS - 1,
-                    variant.POS
+            if offset >= offset_end:
+                break
+            offset += len(line)
+            yield line.decode()
+
+
+def _records(chunk, refseq):
+    """Generate the records of BED file within the byte range, as
+    (chrom, pos, fields, info, fmt), where info is a list of (key, value)
+    items and fmt is the list of FORMAT values"""
+    for line in _bed_lines(chunk):
+        # chr,start,end,name,...
+        items = line.rstrip("\n\r").split("\t")
+        if drop_contigs and items[0] not in contigs:
+            continue
+        chrom = items[0]
+        start = int(items[1])
+        end = int(items[2])
+        pos = start - base + 1
+        record = {"ID": ".", "ALT": ".", "QUAL": ".", "FILTER": "PASS"}
+        info = []
+        fmt = format_values.copy()
+        # If it is not a SNP
+        if end - start > base:
+            info.append(("END", end + 1 - base))
+
+        skip = False
+        for target, key, converter in resolved_converters:
+            val = converter(items)
+            if val is None:
+                # No need to evaluate the rest for a skipped record
+                skip = True
+                break
+            if target == INFO:
+                info.append((key, val))
+            elif target == FORMAT:
+                fmt[key] = val
+            elif key in ("ALT", "FILTER") and not isinstance(val, str):
+                record[key] = ("," if key == "ALT" else ";").join(
+                    str(v) for v in val
                 )
+            else:
+                record[key] = val
+
+        if skip:
+            continue
 
+        if fetch_ref:
+            record["REF"] = refseq.fetch(chrom, pos - 1, pos).upper()
+
+        yield chrom, pos, record, info, fmt
+
+
+def convert(chunk, outfile):
+    """Convert the records of BED file within the byte range to VCF"""
+    refseq = FastaFile(ref)
+    writer = Writer.from_string(outfile, header)
+    # The sample column strings for the FORMAT values, as converting BED
+    # annotations usually produces only a few FORMAT value combinations
+    fmt_cache = {}
+    try:
+        for chrom, pos, record, info, fmt in _records(chunk, refseq):
+            try:
+                fmt_key = tuple(fmt)
+                sample_str = fmt_cache.get(fmt_key)
+            except TypeError:  # unhashable values
+                fmt_key = sample_str = None
+            if sample_str is None:
+                sample_str = ":".join(_to_str(val) for val in fmt)
+                if fmt_key is not None and len(fmt_cache) < FORMAT_CACHE_SIZE:
+                    fmt_cache[fmt_key] = sample_str
+
+            variant = writer.variant_from_string(
+                "\t".join(
+                    [
+                        chrom,
+                        str(pos),
+                        str(record["ID"]),
+                        str(record["REF"]),
+                        str(record["ALT"]),
+                        str(record["QUAL"]),
+                        str(record["FILTER"]),
+                        # Flags are written as bare keys, and omitted if False
+                        ";".join(
+                            key if val is True else f"{key}={_to_str(val)}"
+                            for key, val in info
+                            if val is not False
+                        )
+                        or ".",
+                        format_str,
+                        sample_str,
+                    ]
+                )
+            )
             writer.write_record(variant)
-finally:
-    vcf.close()
-    writer.close()
-
-if index:
-    run_command(
-        [bcftools, "sort", "-O", "z", "-o", outvcf, tmpoutvcf],
-        fg=True,
+    finally:
+        refseq.close()
+        writer.close()
+
+    return outfile
+
+
+def _caster(type_, number):
+    """Get the function to cast the values from the converters to the type of
+    the parquet column, and the type of the column"""
+    import pyarrow as pa
+
+    if type_ == "Flag":
+        return (lambda val: bool(val) and val != "."), pa.bool_()
+    if number != "1":
+        cast, pa_type = _to_str, pa.string()
+    elif type_ == "Integer":
+        cast, pa_type = int, pa.int64()
+    elif type_ == "Float":
+        cast, pa_type = float, pa.float64()
+    else:
+        cast, pa_type = _to_str, pa.string()
+
+    return (lambda val: None if val is None or val == "." else cast(val)), pa_type
+
+
+def _parquet_columns():
+    """Get the columns of the parquet output, as a list of
+    (name, cast, type) for the fields, INFO and FORMAT values"""
+    fields = [
+        ("CHROM", *_caster("String", "1")),
+        ("POS", *_caster("Integer", "1")),
+        ("ID", *_caster("String", "1")),
+        ("REF", *_caster("String", "1")),
+        ("ALT", *_caster("String", "1")),
+        ("QUAL", *_caster("Float", "1")),
+        ("FILTER", *_caster("String", "1")),
+    ]
+    info_meta = {"END": ("Integer", "1")}
+    info_meta.update({info["ID"]: (info["Type"], info["Number"]) for info in infos})
+    info_columns = [(key, *_caster(*meta)) for key, meta in info_meta.items()]
+    format_meta = {fmt["ID"]: (fmt["Type"], fmt["Number"]) for fmt in formats}
+    format_columns = [
+        (f"FORMAT_{key}", *_caster(*format_meta.get(key, ("String", "1"))))
+        for key in format_keys
+    ]
+    return fields, info_columns, format_columns
+
+
+def convert_parquet(chunk, outfile):
+    """Convert the records of BED file within the byte range to parquet"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    fields, info_columns, format_columns = _parquet_columns()
+    schema = pa.schema(
+        [(name, pa_type) for name, _, pa_type in fields + info_columns]
+        + [(name, pa_type) for name, _, pa_type in format_columns]
+    )
+    columns = {name: [] for name in schema.names}
+    refseq = FastaFile(ref)
+    writer = pq.ParquetWriter(outfile, schema, compression="zstd")
+
+    def flush():
+        writer.write_table(pa.Table.from_pydict(columns, schema=schema))
+        for values in columns.values():
+            values.clear()
+
+    try:
+        for chrom, pos, record, info, fmt in _records(chunk, refseq):
+            record["CHROM"] = chrom
+            record["POS"] = pos
+            for name, cast, _ in fields:
+                columns[name].append(cast(record[name]))
+            info = dict(info)
+            for name, cast, _ in info_columns:
+                columns[name].append(cast(info.get(name)))
+            for (name, cast, _), val in zip(format_columns, fmt):
+                columns[name].append(cast(val))
+
+            if len(columns["CHROM"]) >= ROW_GROUP_SIZE:
+                flush()
+        flush()
+    finally:
+        refseq.close()
+        writer.close()
+
+    return outfile
+
+
+def write_parquet(outfile):
+    """Convert the BED file to parquet, in chunks in parallel if ncores > 1,
+    and sort the records if envs.index is True"""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+
+    chunks = _chunks(ncores)
+    if len(chunks) <= 1:
+        partfiles = [convert_parquet((0, Path(inbed).stat().st_size), tmpoutvcf)]
+    else:
+        chunkdir = joboutdir / "chunks"
+        chunkdir.mkdir(exist_ok=True)
+        with ProcessPoolExecutor(max_workers=ncores) as executor:
+            partfiles = list(
+                executor.map(
+                    convert_parquet,
+                    chunks,
+                    [
+                        str(chunkdir / f"chunk{i}.parquet")
+                        for i in range(len(chunks))
+                    ],
+                )
+            )
+
+    if index:
+        table = pa.concat_tables(pq.read_table(partfile) for partfile in partfiles)
+        # Sort by the order of contigs in the reference, then by position
+        rank = pc.index_in(table["CHROM"], value_set=pa.array(contig_names))
+        rank = pc.fill_null(rank, len(contig_names))
+        table = (
+            table.append_column("_rank", rank)
+            .sort_by([("_rank", "ascending"), ("POS", "ascending")])
+            .drop_columns(["_rank"])
+        )
+        pq.write_table(
+            table, outfile, compression="zstd", row_group_size=ROW_GROUP_SIZE
+        )
+    elif len(partfiles) == 1:
+        Path(partfiles[0]).replace(outfile)
+    else:
+        # The parts are in the order of the input file, copy the row groups
+        writer = None
+        for partfile in partfiles:
+            part = pq.ParquetFile(partfile)
+            if writer is None:
+                writer = pq.ParquetWriter(
+                    outfile, part.schema_arrow, compression="zstd"
+                )
+            for i in range(part.num_row_groups):
+                writer.write_table(part.read_row_group(i))
+        writer.close()
+
+    for partfile in partfiles:
+        Path(partfile).unlink(missing_ok=True)
+    if len(chunks) > 1:
+        chunkdir.rmdir()
+
+
+def write_vcf(outfile):
+    """Convert the BED file to VCF, in chunks in parallel if ncores > 1"""
+    chunks = _chunks(ncores)
+    if len(chunks) <= 1:
+        convert((0, Path(inbed).stat().st_size), outfile)
+        return
+
+    chunkdir = joboutdir / "chunks"
+    chunkdir.mkdir(exist_ok=True)
+    with ProcessPoolExecutor(max_workers=ncores) as executor:
+        chunkfiles = list(
+            executor.map(
+                convert,
+                chunks,
+                [str(chunkdir / f"chunk{i}.vcf") for i in range(len(chunks))],
+            )
+        )
+
+    # The chunks are in the order of the input file and share the same
+    # header, so they can be concatenated directly. bcftools concat
+    # requires the chromosome blocks to be contiguous, which is not
+    # guaranteed for the input.
+    with open(outfile, "w") as fout:
+        for i, chunkfile in enumerate(chunkfiles):
+            with open(chunkfile) as fin:
+                for line in fin:
+                    if i == 0 or not line.startswith("#"):
+                        fout.write(line)
+            Path(chunkfile).unlink()
+    chunkdir.rmdir()
+
+
+def _open_fifo(fifo, p):
+    """Open the named pipe for writing once bcftools opens it for reading.
+
+    Opening it in blocking mode would hang forever if bcftools exits before
+    opening it, so it is opened in non-blocking mode and retried while
+    bcftools is still running. The returned file descriptor keeps the pipe
+    open, so that the writers opening it later don't block either.
+    """
+    while True:
+        try:
+            return os.open(fifo, os.O_WRONLY | os.O_NONBLOCK)
+        except OSError as e:
+            # ENXIO: no reader yet
+            if e.errno != errno.ENXIO:
+                raise
+        if p.poll() is not None:
+            raise RuntimeError("Failed to sort the VCF file with bcftools sort")
+        time.sleep(0.1)
+
+
+def main():
+    if outformat == "parquet":
+        write_parquet(outvcf)
+        return
+
+    if not index:
+        write_vcf(tmpoutvcf)
+        Path(tmpoutvcf).replace(outvcf)
+        return
+
+    # Stream the VCF to bcftools sort through a named pipe, so that the
+    # unsorted VCF is never written to and read back from the disk
+    fifo = Path(tmpoutvcf)
+    fifo.unlink(missing_ok=True)
+    os.mkfifo(fifo)
+    p = run_command(
+        [bcftools, "sort", "-O", "z", "-o", outvcf, fifo],
+        wait=False,
     )
+    try:
+        fd = _open_fifo(fifo, p)
+        try:
+            write_vcf(tmpoutvcf)
+        finally:
+            os.close(fd)
+    except BaseException:
+        p.kill()
+        raise
+    finally:
+        fifo.unlink()
+
+    if p.wait() != 0:
+        raise RuntimeError("Failed to sort the VCF file with bcftools sort")
 
     run_command([bcftools, "index", "-t", outvcf], fg=True)
 
 
-else:
-    Path(tmpoutvcf).replace(outvcf)
+if __name__ == "__main__":
+    main()
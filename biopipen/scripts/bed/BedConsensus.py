@@ -22,47 +22,55 @@ def _log(*msg):
     print(*[str(m) for m in msg], file=sys.stderr)
 
 
-def concat_bedfiles():
-    """Concatenate and merge bedfiles."""
-    concatfile = outfile.parent / "_concatenated.bed"
-    sortedfile = outfile.parent / "_sorted.bed"
-    concatfile.write_text("")
-
-    _log("- Concatenating BED files")
-    with open(concatfile, "a") as fout:
-        for bedfile in bedfiles:
-            fout.write(bedfile.read_text())
-
-    _log("- Sorting the concatenated BED file")
-    run_command(
-        [bedtools_path, "sort", "-i", concatfile, "-faidx", chrsize],
-        stdout=sortedfile,
-    )
+def sort_bedfiles():
+    """Sort the BED files, as required by `bedtools multiinter`"""
+    _log("- Sorting BED files")
+    sortedfiles = []
+    for bedfile, stem in zip(bedfiles, stems):
+        sortedfile = outfile.parent / f"_{stem}.sorted.bed"
+        run_command(
+            [bedtools_path, "sort", "-i", bedfile, "-faidx", chrsize],
+            stdout=sortedfile,
+        )
+        sortedfiles.append(sortedfile)
 
-    return sortedfile
+    return sortedfiles
 
 
 def genomecov():
-    """Calculate genome coverage."""
+    """Count the number of files covering each region with
+    `bedtools multiinter`, and filter the regions by the cutoff."""
     _log("- Calculating genome coverage")
-    genomecovfile = outfile.parent / "_genomecov.bed"
     filteredfile = outfile.parent / "_filtered.bed"
-    run_command(
-        [
-            bedtools_path,
-            "genomecov",
-            "-i",
-            concat_bedfiles(),
-            "-g",
-            chrsize,
-            "-bg",
-        ],
-        stdout=genomecovfile,
-    )
-    run_command(
-        ["awk", f'$4 >= {cutoff}', genomecovfile],
-        stdout=filteredfile,
+    sortedfiles = sort_bedfiles()
+    p = run_command(
+        [bedtools_path, "multiinter", "-i", *sortedfiles],
+        stdout=True,
+        wait=False,
     )
+    # multiinter splits the regions where the set of files changes,
+    # join the adjacent ones with the same number of files back
+    last = None
+    with open(filteredfile, "w") as fout:
+        for line in p.stdout:
+            chrom, start, end, num = line.decode().split("\t", 4)[:4]
+            if int(num) < cutoff:
+                continue
+            if last and last[0] == chrom and last[2] == start and last[3] == num:
+                last[2] = end
+                continue
+            if last:
+                fout.write("\t".join(last) + "\n")
+            last = [chrom, start, end, num]
+        if last:
+            fout.write("\t".join(last) + "\n")
+
+    if p.wait() != 0:
+        raise RuntimeError("Failed to run bedtools multiinter")
+
+    for sortedfile in sortedfiles:
+        sortedfile.unlink()
+
     return filteredfile
 
 
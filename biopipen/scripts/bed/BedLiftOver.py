@@ -0,0 +1,334 @@
+"""Script for bed.BedLiftOver"""
+import gzip
+import os
+import pickle
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from pathlib import Path
+
+from biopipen.utils.misc import run_command, logger
+
+inbed = {{in.inbed | repr}}  # pyright: ignore # noqa: #999
+outbed = {{out.outbed | repr}}  # pyright: ignore
+joboutdir = Path({{job.outdir | repr}})  # pyright: ignore
+rejfile = {{job.outdir | joinpaths: "rejected.bed" | repr}}  # pyright: ignore
+liftover = {{envs.liftover | repr}}  # pyright: ignore
+chain = {{envs.chain | repr}}  # pyright: ignore
+engine = {{envs.engine | repr}}  # pyright: ignore
+cache = {{envs.cache | repr}}  # pyright: ignore
+ncores = {{envs.ncores | int}}  # pyright: ignore
+local_chain_dir = {{envs.local_chain_dir | repr}}  # pyright: ignore
+
+
+def _local_chain(url):
+    """Download the chain file to envs.local_chain_dir, only if the remote
+    one is newer than the local copy, and return the local path"""
+    from email.utils import formatdate, parsedate_to_datetime
+    from urllib.error import HTTPError, URLError
+    from urllib.request import Request, urlopen
+
+    chaindir = Path(local_chain_dir).expanduser()
+    chaindir.mkdir(parents=True, exist_ok=True)
+    local = chaindir / url.split("?")[0].rstrip("/").split("/")[-1]
+
+    request = Request(url)
+    if local.is_file():
+        request.add_header(
+            "If-Modified-Since",
+            formatdate(local.stat().st_mtime, usegmt=True),
+        )
+
+    try:
+        response = urlopen(request)
+    except HTTPError as e:
+        if e.code == 304:
+            logger.info(f"Using cached chain file: {local}")
+            return str(local)
+        raise
+    except URLError as e:
+        if local.is_file():
+            logger.warning(f"Failed to check {url} ({e}), using cached {local}")
+            return str(local)
+        raise
+
+    logger.info(f"Downloading chain file: {url} -> {local}")
+    tmpfile = local.with_name(local.name + ".tmp")
+    with response, tmpfile.open("wb") as fout:
+        while True:
+            buf = response.read(1 << 20)
+            if not buf:
+                break
+            fout.write(buf)
+        modified = response.headers.get("Last-Modified")
+
+    tmpfile.replace(local)
+    if modified:
+        mtime = parsedate_to_datetime(modified).timestamp()
+        os.utime(local, (mtime, mtime))
+
+    return str(local)
+
+
+if chain.startswith(("http://", "https://", "ftp://")):
+    chain = _local_chain(chain)
+
+
+def _split_bed(n, chunkdir):
+    """Split the BED file into (at most) n chunk files by lines"""
+    nlines = 0
+    last = b"\n"
+    with open(inbed, "rb") as f:
+        for buf in iter(lambda: f.read(1 << 20), b""):
+            nlines += buf.count(b"\n")
+            last = buf[-1:]
+    # the last line without a trailing newline
+    nlines += last != b"\n"
+
+    per_chunk = -(-nlines // n)
+    chunkfiles = []
+    with open(inbed, "rb") as f:
+        for i in range(n):
+            chunkfile = chunkdir / f"chunk{i}.bed"
+            with chunkfile.open("wb") as fout:
+                fout.writelines(islice(f, per_chunk))
+            if chunkfile.stat().st_size == 0:
+                chunkfile.unlink()
+                break
+            chunkfiles.append(chunkfile)
+
+    return chunkfiles
+
+
+def _concat(files, outfile):
+    with open(outfile, "wb") as fout:
+        for file in files:
+            with open(file, "rb") as fin:
+                while True:
+                    buf = fin.read(1 << 20)
+                    if not buf:
+                        break
+                    fout.write(buf)
+            Path(file).unlink()
+
+
+def lift_ucsc():
+    if ncores <= 1:
+        run_command([liftover, inbed, chain, outbed, rejfile], fg=True)
+        return
+
+    # liftOver is single-threaded, run it on chunks of the BED file in
+    # parallel. The subprocesses do the work, so threads are enough here.
+    chunkdir = joboutdir / "chunks"
+    chunkdir.mkdir(exist_ok=True)
+    chunkfiles = _split_bed(ncores, chunkdir)
+    logger.info(f"Running liftOver on {len(chunkfiles)} chunks in parallel ...")
+    with ThreadPoolExecutor(max_workers=ncores) as executor:
+        list(
+            executor.map(
+                lambda chunkfile: run_command(
+                    [
+                        liftover,
+                        chunkfile,
+                        chain,
+                        f"{chunkfile}.mapped",
+                        f"{chunkfile}.unmapped",
+                    ]
+                ),
+                chunkfiles,
+            )
+        )
+
+    _concat([f"{chunkfile}.mapped" for chunkfile in chunkfiles], outbed)
+    _concat([f"{chunkfile}.unmapped" for chunkfile in chunkfiles], rejfile)
+    for chunkfile in chunkfiles:
+        chunkfile.unlink()
+    chunkdir.rmdir()
+
+
+def _parse_chain():
+    """Parse the chain file into a data frame of the aligned blocks"""
+    import pandas as pd
+
+    blocks = {
+        "tname": [],
+        "tstart": [],
+        "tend": [],
+        "qname": [],
+        "qstart": [],
+        "qsize": [],
+        "qstrand": [],
+        "score": [],
+        "chain": [],
+    }
+    openfunc = gzip.open if chain.endswith(".gz") else open
+    chain_id = -1
+    with openfunc(chain, "rt") as f:
+        for line in f:
+            items = line.split()
+            if not items:
+                continue
+            if items[0] == "chain":
+                # chain score tName tSize tStrand tStart tEnd
+                #   qName qSize qStrand qStart qEnd id
+                chain_id += 1
+                score = float(items[1])
+                tname = items[2]
+                tpos = int(items[5])
+                qname = items[7]
+                qsize = int(items[8])
+                qstrand = items[9]
+                qpos = int(items[10])
+                continue
+
+            # size dt dq, or only size for the last block of a chain
+            size = int(items[0])
+            blocks["tname"].append(tname)
+            blocks["tstart"].append(tpos)
+            blocks["tend"].append(tpos + size)
+            blocks["qname"].append(qname)
+            blocks["qstart"].append(qpos)
+            blocks["qsize"].append(qsize)
+            blocks["qstrand"].append(qstrand)
+            blocks["score"].append(score)
+            blocks["chain"].append(chain_id)
+            if len(items) == 3:
+                tpos += size + int(items[1])
+                qpos += size + int(items[2])
+
+    return pd.DataFrame(blocks)
+
+
+def _load_chain():
+    """Load the aligned blocks, from the cache if possible"""
+    if not cache:
+        return _parse_chain()
+
+    stat = Path(chain).stat()
+    cachefile = Path(cache) / (
+        f"biopipen.bed.BedLiftOver.{Path(chain).name}.{stat.st_mtime_ns}.pkl"
+    )
+    if cachefile.is_file():
+        logger.info(f"Loading parsed chain file from cache: {cachefile}")
+        with cachefile.open("rb") as f:
+            return pickle.load(f)
+
+    logger.info("Parsing chain file ...")
+    blocks = _parse_chain()
+    logger.info(f"Caching parsed chain file: {cachefile}")
+    with cachefile.open("wb") as f:
+        pickle.dump(blocks, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    return blocks
+
+
+def lift_ncls():
+    """Lift the BED records over using NCLS indexes of the chain blocks.
+
+    A record is lifted over when both its start and end fall into aligned
+    blocks of the same chain. When multiple chains are hit, the one with the
+    highest score is used.
+    """
+    import numpy as np
+    import pandas as pd
+    from ncls import NCLS
+
+    try:
+        bed = pd.read_csv(
+            inbed,
+            sep="\t",
+            header=None,
+            comment="#",
+            dtype=str,
+            keep_default_na=False,
+        )
+    except pd.errors.EmptyDataError:
+        # No records, as the ucsc engine does, write empty outputs
+        open(outbed, "w").close()
+        open(rejfile, "w").close()
+        return
+
+    blocks = _load_chain()
+    bed[1] = bed[1].astype(np.int64)
+    bed[2] = bed[2].astype(np.int64)
+    has_strand = bed.shape[1] >= 6
+
+    mapped = []
+    for chrom, rows in bed.groupby(0, sort=False):
+        cblocks = blocks[blocks.tname == chrom]
+        if cblocks.shape[0] == 0:
+            continue
+
+        index = NCLS(
+            cblocks.tstart.to_numpy(np.int64),
+            cblocks.tend.to_numpy(np.int64),
+            np.arange(cblocks.shape[0], dtype=np.int64),
+        )
+        starts = rows[1].to_numpy()
+        ends = rows[2].to_numpy()
+        # the last base of the record
+        lasts = np.maximum(ends - 1, starts)
+        rowidx = np.arange(rows.shape[0], dtype=np.int64)
+
+        srows, sblocks = index.all_overlaps_both(starts, starts + 1, rowidx)
+        erows, eblocks = index.all_overlaps_both(lasts, lasts + 1, rowidx)
+        shits = pd.DataFrame(
+            {
+                "row": srows,
+                "sblock": sblocks,
+                "chain": cblocks.chain.to_numpy()[sblocks],
+                "score": cblocks.score.to_numpy()[sblocks],
+            }
+        )
+        shits = shits.sort_values("score", ascending=False, kind="stable")
+        shits = shits.drop_duplicates("row")
+        ehits = pd.DataFrame(
+            {
+                "row": erows,
+                "eblock": eblocks,
+                "chain": cblocks.chain.to_numpy()[eblocks],
+            }
+        )
+        hits = shits.merge(ehits, on=["row", "chain"]).drop_duplicates("row")
+        if hits.shape[0] == 0:
+            continue
+
+        row = hits.row.to_numpy()
+        sblock = cblocks.iloc[hits.sblock.to_numpy()]
+        eblock = cblocks.iloc[hits.eblock.to_numpy()]
+        mstart = starts[row] - sblock.tstart.to_numpy() + sblock.qstart.to_numpy()
+        mlast = lasts[row] - eblock.tstart.to_numpy() + eblock.qstart.to_numpy()
+        nonempty = (ends[row] > starts[row]).astype(np.int64)
+        minus = sblock.qstrand.to_numpy() == "-"
+        qsize = sblock.qsize.to_numpy()
+
+        out = rows.iloc[row].copy()
+        out[0] = sblock.qname.to_numpy()
+        # Coordinates on the minus strand are counted from the end
+        out[1] = np.where(minus, qsize - mlast - nonempty, mstart)
+        out[2] = np.where(minus, qsize - mstart, mlast + nonempty)
+        if has_strand:
+            out[5] = np.where(
+                minus,
+                out[5].map({"+": "-", "-": "+"}).fillna(out[5]),
+                out[5],
+            )
+        mapped.append(out)
+
+    if mapped:
+        mapped = pd.concat(mapped).sort_index()
+    else:
+        mapped = bed.iloc[0:0]
+
+    mapped.to_csv(outbed, sep="\t", header=False, index=False)
+    bed[~bed.index.isin(mapped.index)].to_csv(
+        rejfile, sep="\t", header=False, index=False
+    )
+
+
+if __name__ == "__main__":
+    if engine == "ucsc":
+        lift_ucsc()
+    elif engine == "ncls":
+        lift_ncls()
+    else:
+        raise ValueError(f"Unknown engine: {engine}")
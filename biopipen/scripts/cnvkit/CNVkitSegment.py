@@ -1,3 +1,4 @@
+import os
 from pathlib import Path
 
 from biopipen.utils.misc import run_command, dict_to_cli_args
@@ -40,7 +41,25 @@ def main():
     )
     args[""] = [cnvkit, "segment"]
     args = dict_to_cli_args(args, dashify=True)
-    run_command(args, fg=True)
+    # `-p` already spreads the segmentation over `ncores` processes, keep
+    # the BLAS/OpenMP pools of each of them (numpy and Rscript) to one thread
+    # to avoid oversubscription of the cores
+    env = os.environ.copy()
+    env.update(
+        {
+            var: "1"
+            for var in (
+                "OMP_NUM_THREADS",
+                "OPENBLAS_NUM_THREADS",
+                "MKL_NUM_THREADS",
+                "NUMEXPR_NUM_THREADS",
+                "BLIS_NUM_THREADS",
+                "GOTO_NUM_THREADS",
+                "VECLIB_MAXIMUM_THREADS",
+            )
+        }
+    )
+    run_command(args, fg=True, env=env)
 
 
 if __name__ == "__main__":
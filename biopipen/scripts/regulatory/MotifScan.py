@@ -1,5 +1,9 @@
 """Script for regulatory.MotifScan"""
+import hashlib
+import pickle
 import re
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
 
 # Paths may be passed in args or to motifdb
 from pathlib import PosixPath  # noqa: F401
@@ -19,6 +23,8 @@ cutoff = {{envs.cutoff | repr}}  # pyright: ignore
 q = {{envs.q | repr}}  # pyright: ignore
 q_cutoff = {{envs.q_cutoff | repr}}  # pyright: ignore
 args = {{envs.args | dict | repr}}  # pyright: ignore
+ncores = {{envs.ncores | int}}  # pyright: ignore
+cache = {{envs.cache | repr}}  # pyright: ignore
 
 # Check if the tool is supported
 if tool != "fimo":
@@ -57,47 +63,220 @@ with open(motiffile, "r") as f:
         if i > 0  # skip header
     )
 
-with open(motifdb, "r") as f:
-    motif_db_names = set(
-        line[6:].strip()
-        for line in f
-        if line.startswith("MOTIF")
-    )
+
+def _index_motifdb():
+    """Index the motif database as the length of the header and the
+    (offset, length) of each MOTIF block, cached in envs.cache"""
+    stat = Path(motifdb).stat()
+    with open(motifdb, "rb") as f:
+        # Hashing the beginning of the file with its size and mtime is enough
+        # to tell the databases apart
+        digest = hashlib.sha1(f.read(1 << 20))
+    digest.update(f"{stat.st_size}:{stat.st_mtime_ns}".encode())
+    cachefile = None
+    if cache:
+        cachefile = Path(cache) / (
+            f"biopipen.regulatory.MotifScan.motifdb.{digest.hexdigest()}.pkl"
+        )
+        if cachefile.is_file():
+            logger.info(f"Loading motif database index from cache: {cachefile}")
+            with cachefile.open("rb") as f:
+                return pickle.load(f)
+
+    logger.info("Indexing motif database ...")
+    header_length = None
+    blocks = {}
+    offset = 0
+    name = None
+    with open(motifdb, "rb") as f:
+        for line in f:
+            if line.startswith(b"MOTIF"):
+                if name is None:
+                    header_length = offset
+                else:
+                    blocks[name] = (blocks[name][0], offset - blocks[name][0])
+                name = line[6:].strip().decode()
+                blocks[name] = (offset, None)
+            offset += len(line)
+    if name is None:
+        header_length = offset
+    else:
+        blocks[name] = (blocks[name][0], offset - blocks[name][0])
+
+    index = (header_length, blocks)
+    if cachefile:
+        logger.info(f"Caching motif database index: {cachefile}")
+        with cachefile.open("wb") as f:
+            pickle.dump(index, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    return index
+
+
+motif_db_header_length, motif_db_blocks = _index_motifdb()
+motif_db_names = set(motif_db_blocks)
 
 if notfound == "error":
     notfound_motifs = motif_names - motif_db_names
     if notfound_motifs:
         raise ValueError(f"Motifs not found in the database: {notfound_motifs}")
 
-# Make a new motif database with only the motifs in the motiffile
+# Make a new motif database with only the motifs in the motiffile, so that
+# fimo scans all of them in a single run
 motif_names = motif_names & motif_db_names
 motifdb_filtered = f"{outdir}/motif_db.txt"
-with open(motifdb, "r") as f, open(motifdb_filtered, "w") as f_out:
-    should_write = True
-    for line in f:
-        if line.startswith("MOTIF"):
-            motif_name = line[6:].strip()
-            if motif_name in motif_names:
-                should_write = True
-            else:
-                should_write = False
-
-        if should_write:
-            f_out.write(line)
-        else:
-            continue
+with open(motifdb, "rb") as f, open(motifdb_filtered, "wb") as f_out:
+    f_out.write(f.read(motif_db_header_length))
+    for motif_name, (offset, length) in motif_db_blocks.items():
+        if motif_name in motif_names:
+            f.seek(offset)
+            f_out.write(f.read(length))
 
 # Now run fimo
 args[""] = fimo
-args["oc"] = f"{outdir}"
 args["thresh"] = cutoff
-args["qv_thresh"] = q_cutoff
-args["no_qvalue"] = not q
 args["no-pgc"] = True
-args["_"] = [motifdb_filtered, seqfile]
 
-logger.info("Running fimo ...")
-run_command(dict_to_cli_args(args, dashify=True), fg=True)
+
+# The columns of fimo.tsv, in case no shard reports them
+FIMO_HEADER = [
+    "motif_id",
+    "motif_alt_id",
+    "sequence_name",
+    "start",
+    "stop",
+    "strand",
+    "score",
+    "p-value",
+    "q-value",
+    "matched_sequence",
+]
+
+
+def _read_fasta(fasta):
+    """Read the sequences as (name line, sequence lines, length) tuples"""
+    seqs = []
+    with open(fasta, "r") as f:
+        for line in f:
+            if line.startswith(">"):
+                seqs.append([line, [], 0])
+            elif seqs:
+                seqs[-1][1].append(line)
+                seqs[-1][2] += len(line.strip())
+    return seqs
+
+
+def _shard_fasta(seqs, n, shard_dir):
+    """Split the sequences into n FASTA files with roughly equal total bases"""
+    shards = [[] for _ in range(n)]
+    sizes = [0] * n
+    for seq in sorted(seqs, key=lambda x: x[2], reverse=True):
+        i = sizes.index(min(sizes))
+        shards[i].append(seq)
+        sizes[i] += seq[2]
+
+    shard_files = []
+    for i, shard in enumerate(shards):
+        if not shard:
+            continue
+        shard_file = shard_dir / f"shard{i}.fa"
+        with shard_file.open("w") as f:
+            for name, lines, _ in shard:
+                f.write(name)
+                f.writelines(lines)
+        shard_files.append(shard_file)
+    return shard_files
+
+
+def _motif_widths(meme):
+    """Get the widths of the motifs in the MEME file"""
+    with open(meme, "r") as f:
+        return [
+            int(re.search(r"\bw=\s*(\d+)", line).group(1))
+            for line in f
+            if line.startswith("letter-probability matrix")
+        ]
+
+
+def _fimo_sharded(seqs):
+    """Run fimo on shards of the sequences in parallel and merge the results.
+
+    The shards are scanned without q-values. Since the q-values are of
+    Benjamini-Hochberg, they can be computed for the reported matches
+    globally, given the total number of tests (positions scanned on each
+    strand for each motif).
+    Only fimo.tsv is produced, the other outputs of fimo are not merged.
+    """
+    shard_dir = Path(outdir) / "shards"
+    shard_dir.mkdir(exist_ok=True)
+    shard_files = _shard_fasta(seqs, ncores, shard_dir)
+
+    def _run_shard(shard_file):
+        shard_args = args.copy()
+        shard_args["oc"] = f"{shard_file}.fimo"
+        shard_args["no_qvalue"] = True
+        shard_args["_"] = [motifdb_filtered, shard_file]
+        run_command(dict_to_cli_args(shard_args, dashify=True))
+        return Path(shard_args["oc"]) / "fimo.tsv"
+
+    logger.info(f"Running fimo on {len(shard_files)} shards in parallel ...")
+    with ThreadPoolExecutor(max_workers=ncores) as executor:
+        shard_outs = list(executor.map(_run_shard, shard_files))
+
+    header = FIMO_HEADER
+    rows = []
+    for shard_out in shard_outs:
+        with shard_out.open("r") as f:
+            line = f.readline().rstrip("\n")
+            if line:
+                header = line.split("\t")
+            for line in f:
+                line = line.rstrip("\n")
+                if line and not line.startswith("#"):
+                    rows.append(line.split("\t"))
+
+    pcol = header.index("p-value")
+    qcol = header.index("q-value")
+    rows.sort(key=lambda row: float(row[pcol]))
+    if q:
+        strands = 1 if args.get("norc") else 2
+        ntests = strands * sum(
+            max(seq[2] - width + 1, 0)
+            for width in _motif_widths(motifdb_filtered)
+            for seq in seqs
+        )
+        qval = 1.0
+        for rank in range(len(rows), 0, -1):
+            row = rows[rank - 1]
+            qval = min(qval, float(row[pcol]) * ntests / rank)
+            row[qcol] = f"{qval:.3g}"
+        if q_cutoff:
+            rows = [row for row in rows if float(row[qcol]) <= cutoff]
+
+    with open(f"{outdir}/fimo.tsv", "w") as f_out:
+        f_out.write("\t".join(header) + "\n")
+        for row in rows:
+            f_out.write("\t".join(row) + "\n")
+
+    for shard_file, shard_out in zip(shard_files, shard_outs):
+        shard_out.unlink()
+        for other in shard_out.parent.iterdir():
+            other.unlink()
+        shard_out.parent.rmdir()
+        shard_file.unlink()
+    shard_dir.rmdir()
+
+
+seqs = _read_fasta(seqfile) if ncores > 1 else []
+if len(seqs) > 1:
+    _fimo_sharded(seqs)
+else:
+    args["oc"] = f"{outdir}"
+    args["qv_thresh"] = q_cutoff
+    args["no_qvalue"] = not q
+    args["_"] = [motifdb_filtered, seqfile]
+
+    logger.info("Running fimo ...")
+    run_command(dict_to_cli_args(args, dashify=True), fg=True)
 
 logger.info("Adding additional information to the output ...")
 # Get the motif to regulator mapping
@@ -1,6 +1,7 @@
 
 from os import path
 from glob import glob
+from itertools import islice
 from biopipen.utils.misc import run_command, logger
 
 indir = {{in.indir | repr}}  # noqa: E999 # pyright: ignore
@@ -30,13 +31,61 @@ cmd = [
     "--out", output,
     "--threads", ncores,
     "--keep-allele-order",
-    "--recode", "A-transpose" if not transpose else "A",
+    "--export", "A-transpose" if not transpose else "A",
 ]
 # if transpose:
 #     cmd += ["tabx"]
 
 run_command(cmd, fg=True, env={"cwd": path.dirname(outfile)})
 
+# Number of lines to buffer before writing
+CHUNKSIZE = 10_000
+
+
+def _compile_template(template, fields):
+    """Compile the template into a format string with positional fields, so
+    that an ID can be composed by a single `str.format()` call
+
+    Args:
+        template: The template with placeholders, e.g. "{chr}_{pos}"
+        fields: The placeholders mapped to the indexes of the fields,
+            e.g. {"chr": 0, "pos": 3}
+    """
+    template = template.replace("{", "{{").replace("}", "}}")
+    for key, idx in fields.items():
+        template = template.replace("{{%s}}" % key, "{%d}" % idx)
+    return template
+
+
+# Fields of .traw/.bim: chr, varid, cm, pos, counted (alt), other (ref)
+varid_fmt = _compile_template(
+    varid,
+    {"chr": 0, "varid": 1, "pos": 3, "ref": 5, "alt": 4},
+)
+
+
+def _variant_id(fields):
+    """Compose the variant ID from the first 6 fields of .traw or .bim"""
+    fields[0] = trans_chr.get(fields[0], fields[0])
+    if fields[1] == "." or fields[1] == "":
+        fields[1] = missing_id
+    return varid_fmt.format(*fields)
+
+
+def _convert_rows(fin, fout, make_id):
+    """Convert the rows, replacing the first 6 fields with the ID composed by
+    `make_id`. The dosages are passed as they are, without being parsed"""
+    while True:
+        lines = list(islice(fin, CHUNKSIZE))
+        if not lines:
+            break
+        out = []
+        for line in lines:
+            fields = line.rstrip("\r\n").split("\t", 6)
+            out.append(f"{make_id(fields)}\t{fields[6]}\n")
+        fout.writelines(out)
+
+
 if not transpose:  # rows are variants, columns are samples
     # .traw file is created, tab-separated, with the following columns:
     trawfile = output + ".traw"
@@ -65,25 +114,7 @@ if not transpose:  # rows are variants, columns are samples
                 header.append(sam)
             fout.write('\t'.join(header) + '\n')
 
-            for line in fin:
-                line = line.strip().split('\t')
-                chrom = trans_chr.get(line[0], line[0])
-                var = line[1]
-                if var == "." or var == "":
-                    var = missing_id
-                pos = line[3]
-                ref = line[5]
-                alt = line[4]
-                variant = (
-                    varid
-                    .replace('{chr}', chrom)
-                    .replace('{varid}', var)
-                    .replace('{pos}', pos)
-                    .replace('{ref}', ref)
-                    .replace('{alt}', alt)
-                )
-                record = [variant] + line[6:]
-                fout.write('\t'.join(record) + '\n')
+            _convert_rows(fin, fout, _variant_id)
 
 else:
     # .raw file is created, tab-separated, with the following columns:
@@ -104,30 +135,9 @@ else:
             header = ["Sample"]
             with open(bimfile, 'r') as fbim:
                 for line in fbim:
-                    line = line.strip().split('\t')
-                    chrom = trans_chr.get(line[0], line[0])
-                    var = line[1]
-                    if var == "." or var == "":
-                        var = missing_id
-                    pos = line[3]
-                    ref = line[5]
-                    alt = line[4]
-                    variant = (
-                        varid
-                        .replace('{chr}', chrom)
-                        .replace('{varid}', var)
-                        .replace('{pos}', pos)
-                        .replace('{ref}', ref)
-                        .replace('{alt}', alt)
-                    )
-                    header.append(variant)
+                    header.append(_variant_id(line.rstrip("\r\n").split("\t")))
             fout.write('\t'.join(header) + '\n')
 
             next(fin)  # skip header
-            for line in fin:
-                line = line.strip().split('\t')
-                fid = line[0]
-                iid = line[1]
-                sam = samid.replace('{fid}', fid).replace('{iid}', iid)
-                record = [sam] + line[6:]
-                fout.write('\t'.join(record) + '\n')
+            samid_fmt = _compile_template(samid, {"fid": 0, "iid": 1})
+            _convert_rows(fin, fout, lambda fields: samid_fmt.format(*fields))
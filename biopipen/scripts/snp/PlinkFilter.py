@@ -97,4 +97,12 @@ if autosome_xy:
 if snps_only:
     args["snps_only"] = snps_only
 
-run_command(dict_to_cli_args(args, dashify=True, dup_key=False), fg=True)
+if not samples_file and not variants_file and not (
+    chr or not_chr or autosome or autosome_xy or snps_only
+):
+    # Nothing to filter, make symbolic links to the input files
+    logger.info("No filters specified, linking the input files ...")
+    for ext in (".bed", ".bim", ".fam"):
+        Path(f"{output}{ext}").symlink_to(Path(f"{input}{ext}").resolve())
+else:
+    run_command(dict_to_cli_args(args, dashify=True, dup_key=False), fg=True)
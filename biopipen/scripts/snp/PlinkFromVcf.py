@@ -1,7 +1,13 @@
-from os import path
+import gzip
+import shutil
+import struct
+from concurrent.futures import ThreadPoolExecutor
+from glob import glob
+from itertools import takewhile
+from os import makedirs, path
 from biopipen.core.filters import dict_to_cli_args
 from biopipen.utils.reference import tabix_index
-from biopipen.utils.misc import run_command
+from biopipen.utils.misc import run_command, logger
 
 invcf = {{in.invcf | repr}}  # noqa: E999 # pyright: ignore
 outprefix = {{in.invcf | stem0 | repr}} # pyright: ignore
@@ -64,15 +70,111 @@ args.setdefault("max_alleles", 2)
 #     run_command(set_vid_cmd, fg=True, env={"cwd": outdir})
 #     invcf = tmpfile
 
-invcf = tabix_index(invcf, "vcf", tabix=tabix)
-args["vcf"] = invcf
-args["out"] = path.join(outdir, outprefix)
-args["threads"] = ncores
 
-cmd = [
-    plink,
-    "--make-bed",
-    *dict_to_cli_args(args, dup_key=False, dashify = True),
-]
+def _vcf_samples(vcf):
+    """Get the sample names from the header of the VCF/BCF file"""
+    if vcf.endswith(".bcf"):
+        # BCF: magic (BCF\2\2), l_text (uint32), then the header text
+        with open(vcf, "rb") as f:
+            compressed = f.read(2) == b"\x1f\x8b"
+        openfunc = gzip.open if compressed else open
+        with openfunc(vcf, "rb") as f:
+            f.read(5)
+            l_text = struct.unpack("<I", f.read(4))[0]
+            header = f.read(l_text).rstrip(b"\0").decode().splitlines()
+    else:
+        openfunc = gzip.open if vcf.endswith(".gz") else open
+        with openfunc(vcf, "rt") as f:
+            header = takewhile(lambda line: line.startswith("#"), f)
+            header = [line for line in header if line.startswith("#CHROM")]
 
-run_command(cmd, fg=True, env={"cwd": outdir})
+    for line in header:
+        if line.startswith("#CHROM"):
+            return line.rstrip("\r\n").split("\t")[9:]
+    return []
+
+
+def _vcf_to_plink(vcf, out, threads):
+    """Convert a single VCF file to PLINK binary files with prefix `out`"""
+    vcfargs = args.copy()
+    if vcf.endswith(".bcf"):
+        # Let plink read the binary records directly, no VCF text to parse
+        vcfargs["bcf"] = vcf
+    else:
+        vcfargs["vcf"] = tabix_index(vcf, "vcf", tabix=tabix)
+    vcfargs["out"] = out
+    vcfargs["threads"] = threads
+
+    cmd = [
+        plink,
+        "--make-bed",
+        *dict_to_cli_args(vcfargs, dup_key=False, dashify = True),
+    ]
+    run_command(cmd, fg=True, env={"cwd": outdir})
+
+
+if not path.isdir(invcf):
+    _vcf_to_plink(invcf, path.join(outdir, outprefix), ncores)
+
+else:
+    # A directory of VCF shards (e.g. one per chromosome), convert them in
+    # parallel and then merge them.
+    shards = sorted(
+        glob(path.join(invcf, "*.vcf"))
+        + glob(path.join(invcf, "*.vcf.gz"))
+        + glob(path.join(invcf, "*.bcf"))
+    )
+    if not shards:
+        raise FileNotFoundError(f"No VCF/BCF files found in `in.invcf`: {invcf}")
+
+    # The shards should have the same samples (in the same order)
+    samples = _vcf_samples(shards[0])
+    for shard in shards[1:]:
+        if _vcf_samples(shard) != samples:
+            raise ValueError(
+                f"Samples in {shard} are different from those in {shards[0]}"
+            )
+
+    # plink is doing the work, threads are enough here
+    nworkers = min(ncores, len(shards))
+    threads = max(1, ncores // nworkers)
+    shard_dir = path.join(outdir, "shards")
+    shard_prefixes = [
+        path.join(shard_dir, f"{i}.{path.basename(shard).split('.')[0]}")
+        for i, shard in enumerate(shards)
+    ]
+    makedirs(shard_dir, exist_ok=True)
+    logger.info(
+        f"Converting {len(shards)} VCF shards with {nworkers} workers ..."
+    )
+    with ThreadPoolExecutor(max_workers=nworkers) as executor:
+        list(
+            executor.map(
+                _vcf_to_plink,
+                shards,
+                shard_prefixes,
+                [threads] * len(shards),
+            )
+        )
+
+    logger.info("Merging the shards ...")
+    merge_list = path.join(shard_dir, "merge_list.txt")
+    with open(merge_list, "w") as f:
+        f.write("\n".join(shard_prefixes) + "\n")
+
+    run_command(
+        [
+            plink,
+            "--pmerge-list",
+            merge_list,
+            "bfile",
+            "--make-bed",
+            "--out",
+            path.join(outdir, outprefix),
+            "--threads",
+            ncores,
+        ],
+        fg=True,
+        env={"cwd": outdir},
+    )
+    shutil.rmtree(shard_dir)
@@ -115,7 +115,12 @@ def do_one_simulation(confitems):
         cmd = f"cut -f2,5,7- {gtmatfile}.plink.recoded.traw | sed 's/\\t/_/'"
 
     if sample_prefix:
-        cmd = f"{cmd} | sed 's/per[0-9]\\+_per/{sample_prefix}/g'"
+        # Only the sample IDs need to be renamed, which are at the beginning
+        # of each line (transposed) or in the header, don't scan the dosages
+        if transpose_gtmat:
+            cmd = f"{cmd} | sed 's/^per[0-9]\\+_per/{sample_prefix}/'"
+        else:
+            cmd = f"{cmd} | sed '1s/per[0-9]\\+_per/{sample_prefix}/g'"
 
     cmd = f"{cmd} > {gtmatfile}"
     run_command(cmd, fg=True)
@@ -1,4 +1,4 @@
-from os import path
+from os import path, remove
 
 from biopipen.utils.misc import run_command, dict_to_cli_args
 
@@ -6,7 +6,9 @@ infile = {{in.infile | quote}}  # pyright: ignore
 outfile = {{out.outfile | quote}}  # pyright: ignore
 joboutdir = {{job.outdir | quote}}  # pyright: ignore
 vcfanno = {{envs.vcfanno | quote}}  # pyright: ignore
+bcftools = {{envs.bcftools | quote}}  # pyright: ignore
 ncores = {{envs.ncores | repr}}  # pyright: ignore
+sites_only = {{envs.sites_only | repr}}  # pyright: ignore
 args = {{envs.args | repr}}  # pyright: ignore
 
 {% set conf = envs.conffile or in.conffile %}
@@ -19,8 +21,80 @@ with open(conffile, "w") as f:
 conffile = {{conf | quote}}
 {% endif %}
 
-args["p"] = ncores
-args["_"] = [conffile, infile]
-args[""] = vcfanno
+if not sites_only:
+    args["p"] = ncores
+    args["_"] = [conffile, infile]
+    args[""] = vcfanno
 
-run_command(dict_to_cli_args(args, dashify=True, prefix="-"), stdout=outfile)
+    run_command(dict_to_cli_args(args, dashify=True, prefix="-"), stdout=outfile)
+
+else:
+    # vcfanno only adds INFO fields, annotate the sites without the
+    # genotypes, and then transfer the INFO back to the records
+    sitesfile = path.join(joboutdir, "sites.vcf.gz")
+    annfile = path.join(joboutdir, "sites.annotated.vcf.gz")
+    run_command(
+        [
+            bcftools,
+            "view",
+            "-G",
+            "--threads",
+            ncores,
+            "-Oz",
+            "-o",
+            sitesfile,
+            infile,
+        ],
+        fg=True,
+    )
+
+    args["p"] = ncores
+    args["_"] = [conffile, sitesfile]
+    args[""] = vcfanno
+    p_anno = run_command(
+        dict_to_cli_args(args, dashify=True, prefix="-"),
+        stdout=True,
+        wait=False,
+    )
+
+    # bcftools annotate needs the annotation file bgzipped and indexed
+    # compress the output of vcfanno through the pipe, without writing it
+    # to disk first
+    run_command(
+        [
+            bcftools,
+            "view",
+            "--threads",
+            ncores,
+            "-Oz",
+            "-o",
+            annfile,
+            "-",
+        ],
+        stdin=p_anno.stdout,
+        fg=True,
+    )
+    p_anno.stdout.close()
+    if p_anno.wait() != 0:
+        raise RuntimeError("Failed to run vcfanno")
+    run_command([bcftools, "index", "-t", annfile], fg=True)
+    run_command(
+        [
+            bcftools,
+            "annotate",
+            "--threads",
+            ncores,
+            "-a",
+            annfile,
+            "-c",
+            "INFO",
+            "-Ov",
+            "-o",
+            outfile,
+            infile,
+        ],
+        fg=True,
+    )
+
+    for file in (sitesfile, annfile, f"{annfile}.tbi"):
+        remove(file)
@@ -1,7 +1,14 @@
+from multiprocessing import get_context
+from pathlib import Path
+
+import pysam
 from cyvcf2 import VCF, Writer, Variant
+from biopipen.utils.misc import run_command
 
 infile = {{in.invcf | repr}}  # pyright: ignore
 outfile = {{out.outfile | repr}}  # pyright: ignore
+bcftools = {{envs.bcftools | repr}}  # pyright: ignore
+ncores = {{envs.ncores | int}}  # pyright: ignore
 
 {{envs.helper}}
 
@@ -31,39 +38,120 @@ def QUAL(variant: Variant, cutoff, nonrev: bool = True):
     ret = variant.QUAL >= cutoff
     return nonrev and ret
 
+@builtin_filters
+def GQ(variant: Variant, cutoff, nonrev: bool = True):
+    """Filter variants with GQ of all samples above or below cutoff"""
+    # (nsamples, 1) array of all samples at once, instead of a python loop
+    gq = variant.format("GQ")
+    if gq is None:
+        return False
+    # missing values are negative (int32 min)
+    gq = gq[gq >= 0]
+    if gq.size == 0:
+        return False
+    ret = bool((gq >= cutoff).all())
+    return ret if nonrev else not ret
+
 for name, filt in filters.items():
     if name in BUILTIN_FILTERS:
         if not isinstance(filt, tuple):
             filt = (filt, )
-        filters[name] = lambda variant: BUILTIN_FILTERS[name](variant, *filt)
+        # bind the filter and its arguments now, not when it is called
+        filters[name] = (
+            lambda variant, _func=BUILTIN_FILTERS[name], _args=filt:
+            _func(variant, *_args)
+        )
         filters[name].__doc__ = BUILTIN_FILTERS[name].__doc__
     else:
         filters[name] = eval(filt)
         filters[name].__doc__ = filter_descs.get(name, filt)
 
 
-invcf = VCF(infile)
-for name, filt in filters.items():
-    invcf.add_filter_to_header({
-        'ID': name,
-        'Description': filt.__doc__,
-    })
+def _open_vcf():
+    invcf = VCF(infile)
+    for name, filt in filters.items():
+        invcf.add_filter_to_header({
+            'ID': name,
+            'Description': filt.__doc__,
+        })
+    return invcf
+
+
+def _filter_variants(variants, outvcf):
+    for variant in variants:
+        for name, filt in filters.items():
+            if not filt(variant):
+                if not variant.FILTER:
+                    variant.FILTER = name
+                else:
+                    variant.FILTER = f"{variant.FILTER};{name}"
+        if variant.FILTER and not keep:
+            continue
+        outvcf.write_record(variant)
+
+
+def _filter_contig(args):
+    """Filter the variants of a contig into a separate VCF file"""
+    contig, contigfile = args
+    invcf = _open_vcf()
+    outvcf = Writer(contigfile, invcf)
+    _filter_variants(invcf(contig), outvcf)
+    invcf.close()
+    outvcf.close()
+    return contigfile
+
+
+def _indexed_contigs(vcffile):
+    """Get the contigs from the tabix/CSI index of the VCF file, including
+    the ones not declared in the header. Return None if it is not indexed"""
+    for ext in (".tbi", ".csi"):
+        idxfile = f"{vcffile}{ext}"
+        if Path(idxfile).is_file():
+            with pysam.TabixFile(vcffile, index=idxfile) as tbx:
+                return list(tbx.contigs)
+    return None
+
+
+contigs = _indexed_contigs(infile) if ncores > 1 else None
+
+if contigs:
+    # The contigs are independent, filter them in parallel with region
+    # queries, and concatenate the results in the order of the contigs
+    contigdir = Path(outfile).parent / "contigs"
+    contigdir.mkdir(exist_ok=True)
+    jobs = [
+        (contig, str(contigdir / f"{i}.vcf"))
+        for i, contig in enumerate(contigs)
+    ]
+    # fork, so that the filters (lambdas) don't need to be pickled
+    with get_context("fork").Pool(min(ncores, len(jobs))) as pool:
+        contigfiles = pool.map(_filter_contig, jobs)
+
+    run_command(
+        [
+            bcftools,
+            "concat",
+            "--threads",
+            ncores,
+            "-O",
+            "z" if outfile.endswith(".gz") else "v",
+            "-o",
+            outfile,
+            *contigfiles,
+        ],
+        fg=True,
+    )
+    for contigfile in contigfiles:
+        Path(contigfile).unlink()
+    contigdir.rmdir()
 
-if outfile.endswith(".gz"):
-    outvcf = Writer(outfile, invcf, "wz")
 else:
-    outvcf = Writer(outfile, invcf)
+    invcf = _open_vcf()
+    if outfile.endswith(".gz"):
+        outvcf = Writer(outfile, invcf, "wz")
+    else:
+        outvcf = Writer(outfile, invcf)
 
-for variant in invcf:
-    for name, filt in filters.items():
-        if not filt(variant):
-            if not variant.FILTER:
-                variant.FILTER = name
-            else:
-                variant.FILTER = f"{variant.FILTER};{name}"
-    if variant.FILTER and not keep:
-        continue
-    outvcf.write_record(variant)
-
-invcf.close()
-outvcf.close()
+    _filter_variants(invcf, outvcf)
+    invcf.close()
+    outvcf.close()
@@ -1,3 +1,7 @@
+import gzip
+import shutil
+from pathlib import Path
+
 # for fixes to evaluate
 from biopipen.scripts.vcf.VcfFix_utils import (  # noqa: F401
     HeaderItem,
@@ -43,4 +47,12 @@ fix[{{key | quote}}] = {{value | repr}}  # pyright: ignore
 fixes.append(fix)
 {%- endfor %}  # pyright: ignore
 
-fix_vcffile(infile, outfile, fixes)
+if not fixes:
+    # Nothing to fix, pass the file through without parsing the records
+    if infile.endswith(".gz"):
+        with gzip.open(infile, "rb") as fin, open(outfile, "wb") as fout:
+            shutil.copyfileobj(fin, fout)
+    else:
+        Path(outfile).symlink_to(Path(infile).resolve())
+else:
+    fix_vcffile(infile, outfile, fixes)
@@ -1,8 +1,43 @@
+import io
 import re
 import gzip
+import shutil
+from contextlib import contextmanager
+from itertools import chain
+from subprocess import Popen, PIPE
 from biopipen.utils.vcf import *  # noqa: F401, F403
 
 
+@contextmanager
+def _open_vcf(vcffile):
+    """Open the VCF file to read. A gzipped file is decompressed by `pigz` in
+    another process if it is available, otherwise by `gzip.open()`"""
+    vcffile = str(vcffile)
+    if not vcffile.endswith(".gz"):
+        with open(vcffile, "rt") as fin:
+            yield fin
+        return
+
+    pigz = shutil.which("pigz")
+    if not pigz:
+        with gzip.open(vcffile, "rt") as fin:
+            yield fin
+        return
+
+    proc = Popen([pigz, "-dc", vcffile], stdout=PIPE)
+    try:
+        with io.TextIOWrapper(proc.stdout) as fin:
+            yield fin
+    except BaseException:
+        proc.kill()
+        raise
+    finally:
+        retcode = proc.wait()
+
+    if retcode != 0:
+        raise RuntimeError(f"Failed to decompress {vcffile} with {pigz}")
+
+
 def line_to_obj(line: str):
 
     for line_obj in (
@@ -51,6 +86,16 @@ def handle_obj(obj, fixes: dict):
     return None
 
 
+def _write_fixed(fout, obj, out):
+    """Write the record, or the fixed one returned by `handle_obj()`"""
+    if out is False:
+        return
+    elif out is None:
+        fout.write(str(obj) + "\n")
+    else:
+        fout.write(str(out).rstrip("\n") + "\n")
+
+
 def fix_vcffile(vcffile, outfile, fixes):
     header_append_fixes = []
     variant_append_fixes = []
@@ -63,21 +108,42 @@ def fix_vcffile(vcffile, outfile, fixes):
         else:
             modify_fixes.append(fix)
 
-    inopen = gzip.open if str(vcffile).endswith(".gz") else open
-    with inopen(vcffile, "rt") as fin, open(outfile, "w") as fout:
+    # Variants are the bulk of the file, write them as they are, without
+    # parsing them, when no fixes apply to them
+    parse_variants = any(
+        fix.get("kind") in (None, "variant") for fix in modify_fixes
+    )
+
+    with _open_vcf(vcffile) as fin, open(outfile, "w") as fout:
+        # The header, till the first variant
         for line in fin:
+            if not line.startswith("#"):
+                break
+
             obj = line_to_obj(line)
             out = handle_obj(obj, modify_fixes)
             if obj.kind == "fields":
                 for fix in header_append_fixes:
                     fout.write(str(fix["fix"](None)).rstrip("\n") + "\n")
 
-            if out is False:
-                continue
-            elif out is None:
-                fout.write(str(obj) + "\n")
-            else:
-                fout.write(str(out).rstrip("\n") + "\n")
+            _write_fixed(fout, obj, out)
+        else:
+            # no variants
+            line = None
+
+        # The variants, no more header lines to check
+        if line is not None and parse_variants:
+            for line in chain([line], fin):
+                obj = Variant.from_str(line)
+                _write_fixed(fout, obj, handle_obj(obj, modify_fixes))
+        elif line is not None:
+            fout.write(line)
+            last = line[-1]
+            for buf in iter(lambda: fin.read(1 << 20), ""):
+                fout.write(buf)
+                last = buf[-1]
+            if last != "\n":
+                fout.write("\n")
 
         for fix in variant_append_fixes:
             out = fix["fix"](None)
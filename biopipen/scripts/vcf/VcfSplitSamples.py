@@ -10,6 +10,7 @@ gz = {{envs.gz | repr}}  # pyright: ignore
 index = {{envs.index | repr}}  # pyright: ignore
 ncores = {{envs.ncores | int}}  # pyright: ignore
 private = {{envs.private | repr}}  # pyright: ignore
+plugin = {{envs.plugin | repr}}  # pyright: ignore
 
 if index:
     gz = True
@@ -18,6 +19,19 @@ if index:
 o = check_output([bcftools, "query", "-l", infile])
 samples = o.decode().strip().splitlines()
 
+# Share the cores among the samples, the spare ones are used by bcftools
+# to compress the output
+njobs = max(1, min(ncores, len(samples)))
+threads = max(1, ncores // njobs)
+
+
+def _index(outfile):
+    cmd = [bcftools, "index", "--threads", str(threads), "-t", outfile]
+    print("  running:")
+    print("  ", shlex.join(cmd))
+    if Popen(cmd).wait() != 0:
+        raise RuntimeError(f"Failed to index {outfile}")
+
 
 def do_sample(sample):
     """Do one sample"""
@@ -27,14 +41,15 @@ def do_sample(sample):
     else:
         outfile = f"{outdir}/{sample}.vcf"
 
-    # Get the index of the sample in the vcf file: sample in samples
-    sample_idx = samples.index(sample)
-    cmd = [
-        bcftools,
-        "view",
-        "-e",
-        f'GT[{sample_idx}]="RR" | GT[{sample_idx}]="mis"',
+    cmd = [bcftools, "view"]
+    if private:
+        # Get the index of the sample in the vcf file: sample in samples
+        sample_idx = samples.index(sample)
+        cmd += ["-e", f'GT[{sample_idx}]="RR" | GT[{sample_idx}]="mis"']
+    cmd += [
         "-Oz" if gz else "-Ov",
+        "--threads",
+        str(threads),
         "-s",
         sample,
         "-o",
@@ -44,14 +59,33 @@ def do_sample(sample):
     print("  running:")
     print("  ", shlex.join(cmd))
     p = Popen(cmd, stdout=sys.stdout, stderr=sys.stderr)
-    p.wait()
+    if p.wait() != 0:
+        raise RuntimeError(f"Failed to extract sample {sample}")
 
     if index:
-        cmd = [bcftools, "index", "-t", outfile]
-        print("  running:")
-        print("  ", shlex.join(cmd))
-        Popen(cmd).wait()
+        _index(outfile)
+
 
+if plugin:
+    # Write all the samples in a single pass over the input file, the
+    # expression is applied to the output of each sample
+    print("- Splitting samples ...")
+    cmd = [bcftools, "+split", "-O", "z" if gz else "v", "-o", outdir]
+    if private:
+        cmd += ["-e", 'GT="RR" | GT="mis"']
+    cmd.append(infile)
+    print("  running:")
+    print("  ", shlex.join(cmd))
+    p = Popen(cmd, stdout=sys.stdout, stderr=sys.stderr)
+    if p.wait() != 0:
+        raise RuntimeError("Failed to split the samples")
+
+    if index:
+        outfiles = [f"{outdir}/{sample}.vcf.gz" for sample in samples]
+        with concurrent.futures.ThreadPoolExecutor(njobs) as executor:
+            list(executor.map(_index, outfiles))
 
-with concurrent.futures.ProcessPoolExecutor(max_workers=ncores) as executor:
-    executor.map(do_sample, samples)
+else:
+    # The work is done by bcftools, threads are enough to drive the processes
+    with concurrent.futures.ThreadPoolExecutor(max_workers=njobs) as executor:
+        list(executor.map(do_sample, samples))
@@ -72,8 +72,11 @@ def decor(msg: str, local_only: bool | Callable = False):
 def md5sum(file):
     if not Path(file).exists():
         return None
+    md5 = hashlib.md5()
     with open(file, "rb") as f:
-        return hashlib.md5(f.read()).hexdigest()
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            md5.update(chunk)
+    return md5.hexdigest()
 
 
 def download_reffa(genome):
@@ -84,9 +87,11 @@ def download_reffa(genome):
     outfile = outdir / "allchrs.fa.gz"
     reffa = outdir / "chrs.fa"
 
+    # The sequences are large, download them with more connections
     aria2c_args = dict(
-        s=2,
-        x=2,
+        s=16,
+        x=16,
+        k="1M",
         o=outfile.name,
         d=outdir,
         _=url,
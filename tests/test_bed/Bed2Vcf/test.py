@@ -1,5 +1,8 @@
+import gzip
 from pathlib import Path
 
+import pyarrow as pa
+import pyarrow.parquet as pq
 from biopipen.ns.bed import Bed2Vcf as Bed2Vcf_
 from biopipen.core.testing import get_pipeline
 
@@ -21,12 +24,18 @@ class Bed2Vcf(Bed2Vcf_):
                 "Type": "String",
                 "Description": "Type of structural variant"
             },
+            {
+                "ID": "Span",
+                "Number": "2",
+                "Type": "Integer",
+                "Description": "Start and end of the region in the BED file"
+            },
         ],
         "formats": [
             {
                 "ID": "Depth",
                 "Number": "1",
-                "Type": "Interger",
+                "Type": "Integer",
                 "Description": "Depth of coverage"
             },
         ],
@@ -35,14 +44,24 @@ class Bed2Vcf(Bed2Vcf_):
             "ALT": "lambda items: f'<{items[4]}>'",
             "SVType": "lambda items: items[4]",
             "Depth": "lambda items: int(items[5])",
+            "Span": "lambda items: [int(items[1]), int(items[2])]",
         }
     }
 
 
+class Bed2VcfParquet(Bed2Vcf):
+    envs = {"outformat": "parquet", "index": False}
+
+
+class Bed2VcfChunks(Bed2Vcf):
+    # 2 chunks for the 4 records, concatenated without sorting
+    envs = {"ncores": 2, "index": False}
+
+
 def pipeline():
     return (
         get_pipeline(__file__)
-        .set_starts(Bed2Vcf)
+        .set_starts(Bed2Vcf, Bed2VcfParquet, Bed2VcfChunks)
         .set_data([Path(__file__).parent / "data" / "in.bed"])
     )
 
@@ -50,9 +69,48 @@ def pipeline():
 def testing(pipen):
     # assert pipen._succeeded
     outfile = (
-        pipen.procs[-1].workdir.joinpath("0", "output", "in.vcf.gz")
+        pipen.procs[0].workdir.joinpath("0", "output", "in.vcf.gz")
+    )
+    assert outfile.is_file()
+    with gzip.open(outfile, "rt") as f:
+        records = [
+            line.split("\t") for line in f if not line.startswith("#")
+        ]
+    record = next(record for record in records if record[2] == "S1")
+    # multiple values are joined by ","
+    assert "Span=10,20" in record[7].split(";")
+
+    outfile = (
+        pipen.procs[1].workdir.joinpath("0", "output", "in.parquet")
+    )
+    assert outfile.is_file()
+    table = pq.read_table(outfile)
+    assert table.column_names == [
+        "CHROM", "POS", "ID", "REF", "ALT", "QUAL", "FILTER",
+        "END", "SVType", "Span", "FORMAT_GT", "FORMAT_Depth",
+    ]
+    assert table.schema.field("POS").type == pa.int64()
+    assert table.schema.field("QUAL").type == pa.float64()
+    assert table.schema.field("END").type == pa.int64()
+    assert table.schema.field("Span").type == pa.string()
+    assert table.schema.field("FORMAT_Depth").type == pa.int64()
+    assert table.column("Span").to_pylist()[0] == "10,20"
+
+    outfile = (
+        pipen.procs[2].workdir.joinpath("0", "output", "in.vcf")
     )
     assert outfile.is_file()
+    with open(outfile) as f:
+        records = [
+            line.split("\t") for line in f if not line.startswith("#")
+        ]
+    # records are in the order of the input file
+    assert [record[2] for record in records] == ["S1", "S2", "S3", "S4"]
+    for record in records:
+        assert record[3] in ("A", "C", "G", "T", "N")
+    assert [record[4] for record in records] == [
+        "<DUP>", "<DEL>", "<DEL>", "<INS>"
+    ]
 
 
 if __name__ == "__main__":
@@ -0,0 +1,50 @@
+from pathlib import Path
+
+from biopipen.ns.bed import BedLiftOver as BedLiftOver_
+from biopipen.core.testing import get_pipeline
+
+
+class BedLiftOver(BedLiftOver_):
+    envs = {
+        "engine": "ncls",
+        "chain": str(Path(__file__).parent / "data" / "test.over.chain"),
+        "cache": False,
+    }
+
+
+def pipeline():
+    return (
+        get_pipeline(__file__)
+        .set_starts(BedLiftOver)
+        .set_data(
+            [
+                Path(__file__).parent / "data" / "in.bed",
+                Path(__file__).parent / "data" / "empty.bed",
+            ]
+        )
+    )
+
+
+def testing(pipen):
+    # assert pipen._succeeded
+    outdir = pipen.procs[-1].workdir.joinpath("0", "output")
+    outfile = outdir / "in.bed"
+    assert outfile.is_file()
+    assert outfile.read_text().splitlines() == [
+        "chr1\t110\t120\tr1\t0\t+",
+        # chr3 is mapped to the minus strand of chr4
+        "chr4\t980\t990\tr3\t0\t-",
+    ]
+    assert (outdir / "rejected.bed").read_text().splitlines() == [
+        "chr2\t5\t10\tr2\t0\t+",
+    ]
+
+    outdir = pipen.procs[-1].workdir.joinpath("1", "output")
+    assert (outdir / "empty.bed").read_text() == ""
+    assert (outdir / "rejected.bed").read_text() == ""
+
+
+if __name__ == "__main__":
+    pipen = pipeline()
+    assert pipen.run()
+    testing(pipen)
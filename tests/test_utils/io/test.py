@@ -0,0 +1,120 @@
+from pathlib import Path
+from unittest import TestCase, main
+from biopipen.core.testing import r_test
+
+
+class TestUtilsIo(TestCase):
+
+    SOURCE_FILE = Path(__file__).parent.parent.parent.parent.joinpath(
+        "biopipen", "utils", "io.R"
+    )
+
+    # Record whether fread.opts falls back to read.table.opts
+    FALLBACK = """
+        fallback <- FALSE
+        .read.table.opts <- read.table.opts
+        read.table.opts <- function(file, opts) {
+            fallback <<- TRUE
+            .read.table.opts(file, opts)
+        }
+        infile <- tempfile(fileext = ".txt")
+        writeLines(
+            c("id\\tSample-1\\tb", "r1\\t1\\tx", "r1\\t2\\ty"),
+            infile
+        )
+    """
+
+    @r_test
+    def test_fread_opts_row_names(self):
+        return self.FALLBACK + """
+            opts <- list(
+                header = TRUE,
+                sep = "\\t",
+                row.names = -1,
+                quote = "\\"",
+                comment.char = ""
+            )
+            out <- fread.opts(infile, opts)
+
+            expect(!fallback, "fallback ==", fallback)
+            expect(is.data.frame(out), "class(out) ==", class(out)[1])
+            expect(
+                identical(rownames(out), c("r1", "r1.1")),
+                "rownames(out) ==", paste(rownames(out), collapse = ",")
+            )
+            # check.names = TRUE as read.table
+            expect(
+                identical(colnames(out), c("Sample.1", "b")),
+                "colnames(out) ==", paste(colnames(out), collapse = ",")
+            )
+            expect(identical(out$Sample.1, c(1L, 2L)), "out$Sample.1 ==", out$Sample.1)
+        """
+
+    @r_test
+    def test_fread_opts_positive_row_names(self):
+        return self.FALLBACK + """
+            writeLines(c("id\\ta", "r1\\t1", "r2\\t2"), infile)
+            opts <- list(
+                header = TRUE,
+                row.names = 1,
+                check.names = FALSE,
+                quote = "",
+                comment.char = ""
+            )
+            out <- fread.opts(infile, opts)
+
+            expect(!fallback, "fallback ==", fallback)
+            expect(
+                identical(rownames(out), c("r1", "r2")),
+                "rownames(out) ==", paste(rownames(out), collapse = ",")
+            )
+            expect(identical(colnames(out), "a"), "colnames(out) ==", colnames(out))
+        """
+
+    @r_test
+    def test_fread_opts_fallback_defaults(self):
+        return self.FALLBACK + """
+            # the default quote and comment.char of read.table
+            out <- fread.opts(infile, list(header = TRUE, sep = "\\t", row.names = -1))
+
+            expect(fallback, "fallback ==", fallback)
+            expect(
+                identical(rownames(out), c("r1", "r1.1")),
+                "rownames(out) ==", paste(rownames(out), collapse = ",")
+            )
+            expect(
+                identical(colnames(out), c("Sample.1", "b")),
+                "colnames(out) ==", paste(colnames(out), collapse = ",")
+            )
+        """
+
+    @r_test
+    def test_fread_opts_fallback_unsupported(self):
+        return self.FALLBACK + """
+            base <- list(header = TRUE, sep = "\\t", quote = "", comment.char = "")
+
+            # option not supported by fread
+            fallback <- FALSE
+            fread.opts(infile, c(base, list(flush = TRUE)))
+            expect(fallback, "fallback with flush ==", fallback)
+
+            # non-numeric row.names
+            fallback <- FALSE
+            writeLines(c("id\ta", "r1\t1", "r2\t2"), infile)
+            out <- fread.opts(infile, c(base, list(row.names = "id")))
+            expect(fallback, "fallback with row.names = 'id' ==", fallback)
+            expect(
+                identical(rownames(out), c("r1", "r2")),
+                "rownames(out) ==", paste(rownames(out), collapse = ",")
+            )
+
+            # comment.char
+            fallback <- FALSE
+            base$comment.char <- "#"
+            fread.opts(infile, base)
+            expect(fallback, "fallback with comment.char ==", fallback)
+        """
+
+
+if __name__ == "__main__":
+    main(verbosity=2)